@@ -1,17 +1,22 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import sys
 import time
-import requests
-import subprocess
 from threading import Lock
 from flask import Blueprint, jsonify, request
 
+import http_client
+from dataset_cache import DatasetCache
+from jobs import JobError, JobQueue, QueueFull
+from oracle_store import OracleStore, id_order
+
 api = Blueprint("api", __name__)
 
 # ---------------------------------------------------------------------
-# Persistent feed (Milestone 2)
+# Persistent feed (Milestone 2), kept resident by OracleStore
 # Shape:
 # {
 #   "cert_by_issuer": { "1": {"ok":1,"std":"JGAP","sub":"..."} },
@@ -19,28 +24,36 @@ api = Blueprint("api", __name__)
 # }
 # ---------------------------------------------------------------------
 
-_CACHE_LOCK = Lock()
-
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 CACHE_PATH = os.path.join(PROJECT_ROOT, "data", "oracle_cache.json")
 DATASET_URL_DEFAULT = "https://raw.githubusercontent.com/Sapient-Predictive-Analytics/hashirwa/tech/m2/data/hashirwa_oracle.json"
 
-def _ensure_cache_file():
-    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
-    if not os.path.exists(CACHE_PATH):
-        with open(CACHE_PATH, "w", encoding="utf-8") as f:
-            json.dump({"cert_by_issuer": {}, "price_by_issuer": {}}, f, ensure_ascii=False, indent=2)
+# Parsed once; re-read only when another worker changes the file
+ORACLE = OracleStore(CACHE_PATH)
+
+# Remote dataset kept locally with TTL + conditional revalidation
+DATASETS = DatasetCache()
+
+# Chainlink Functions requests run as background jobs (state in data/jobs.db)
+JOBS_DB_PATH = os.environ.get("HASHIRWA_JOBS_DB", "").strip() or os.path.join(PROJECT_ROOT, "data", "jobs.db")
+JOBS = JobQueue(JOBS_DB_PATH, workers=int(os.environ.get("HASHIRWA_JOB_WORKERS", "2")))
+CHAINLINK_FUNCTIONS_DIR = os.environ.get("CHAINLINK_FUNCTIONS_DIR", "~/chainlink-functions-jp")
+CHAINLINK_TIMEOUT_S = 120
+
+# One FunctionsClient per process, built on the first job and kept warm
+_CHAINLINK = None
+_CHAINLINK_LOCK = Lock()
 
+# Upper bound on issuer_ids per /api/v1/demo/batch call
+BATCH_MAX_IDS = 500
 
-def _load_cache():
-    _ensure_cache_file()
-    with open(CACHE_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
 
+def _cert_fields(rec: dict) -> dict:
+    return {"ok": int(rec.get("ok", 0)), "std": rec.get("std", "JGAP"), "sub": rec.get("sub", "")}
 
-def _save_cache(cache: dict):
-    with open(CACHE_PATH, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def _price_fields(rec: dict) -> dict:
+    return {"ok": int(rec.get("ok", 0)), "sku": rec.get("sku", ""), "jpykg": float(rec.get("jpykg", 0.0))}
 
 
 # ---------------------------------------------------------------------
@@ -52,6 +65,17 @@ def api_health():
     return jsonify({"ok": True})
 
 
+@api.get("/api/v1/metrics")
+def api_metrics():
+    # Outbound connection reuse (requests vs. connections opened per host)
+    out = {"ok": True, "http": http_client.stats()}
+    # Receipt/Response polling, once the Chainlink client has been loaded
+    functions_request = sys.modules.get("functions_request")
+    if functions_request is not None:
+        out["chainlink_polls"] = functions_request.poll_stats()
+    return jsonify(out)
+
+
 # ---------------------------------------------------------------------
 # Listing-based endpoints used by listings.html refresh buttons
 # These read from the persistent cache (set via admin endpoints below).
@@ -65,20 +89,12 @@ def demo_cert_for_listing():
 
     ts = int(time.time() * 1000)
 
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        rec = cache.get("cert_by_issuer", {}).get(issuer_id)
+    rec = ORACLE.get("cert_by_issuer", issuer_id)
 
     if not rec:
         return jsonify({"ok": 0, "issuer_id": int(issuer_id), "ts": ts})
 
-    return jsonify({
-        "ok": int(rec.get("ok", 0)),
-        "std": rec.get("std", "JGAP"),
-        "sub": rec.get("sub", ""),
-        "issuer_id": int(issuer_id),
-        "ts": ts
-    })
+    return jsonify({**_cert_fields(rec), "issuer_id": int(issuer_id), "ts": ts})
 
 
 @api.get("/api/v1/demo/price")
@@ -89,20 +105,42 @@ def demo_price_for_listing():
 
     ts = int(time.time() * 1000)
 
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        rec = cache.get("price_by_issuer", {}).get(issuer_id)
+    rec = ORACLE.get("price_by_issuer", issuer_id)
 
     if not rec:
         return jsonify({"ok": 0, "issuer_id": int(issuer_id), "ts": ts})
 
-    return jsonify({
-        "ok": int(rec.get("ok", 0)),
-        "sku": rec.get("sku", ""),
-        "jpykg": float(rec.get("jpykg", 0.0)),
-        "issuer_id": int(issuer_id),
-        "ts": ts
-    })
+    return jsonify({**_price_fields(rec), "issuer_id": int(issuer_id), "ts": ts})
+
+
+@api.get("/api/v1/demo/batch")
+def demo_batch_for_listings():
+    # One call for a whole listings page:
+    # ?issuer_ids=1,2,3&fields=cert,price -> {"items": {"1": {"cert": {...}, "price": {...}}}}
+    ids = [i.strip() for i in request.args.get("issuer_ids", "").split(",") if i.strip()]
+    if not ids or not all(i.isdigit() for i in ids):
+        return jsonify({"ok": 0, "err": "invalid_issuer_ids"}), 400
+    if len(ids) > BATCH_MAX_IDS:
+        return jsonify({"ok": 0, "err": "too_many_issuer_ids", "max": BATCH_MAX_IDS}), 400
+
+    fields = [f.strip() for f in (request.args.get("fields", "") or "cert,price").split(",") if f.strip()]
+    if not fields or any(f not in ("cert", "price") for f in fields):
+        return jsonify({"ok": 0, "err": "invalid_fields"}), 400
+
+    # Every record comes from the same snapshot
+    snap = ORACLE.current()
+    items = {}
+    for issuer_id in dict.fromkeys(str(int(i)) for i in ids):
+        item = {}
+        if "cert" in fields:
+            rec = snap.get("cert_by_issuer", issuer_id)
+            item["cert"] = _cert_fields(rec) if rec else {"ok": 0}
+        if "price" in fields:
+            rec = snap.get("price_by_issuer", issuer_id)
+            item["price"] = _price_fields(rec) if rec else {"ok": 0}
+        items[issuer_id] = item
+
+    return jsonify({"ok": 1, "version": snap.version, "ts": int(time.time() * 1000), "items": items})
 
 @api.get("/api/v1/cl/cert")
 def cl_cert():
@@ -114,9 +152,7 @@ def cl_cert():
     # refresh cert from GitHub into cache (reuse your existing endpoint logic internally if you prefer)
     # simplest: call the same underlying function you already use; otherwise, just load from cache after refresh_one
     # Here: read from cache only (assumes you've recently refreshed via refresh_cert_one)
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        rec = cache.get("cert_by_issuer", {}).get(issuer_id)
+    rec = ORACLE.get("cert_by_issuer", issuer_id)
 
     if not rec:
         return (f"0|CERT|{issuer_id}|NA", 200)
@@ -136,21 +172,12 @@ def cl_price():
     if not issuer_id.isdigit():
         return jsonify({"ok": 0, "err": "bad_issuer_id"}), 400
 
-    # Always fetch GitHub raw for Chainlink verification
+    # GitHub raw dataset for Chainlink verification, served from the local
+    # cache when fresh and revalidated (ETag/Last-Modified) when not
     url = request.args.get("url", "").strip() or DATASET_URL_DEFAULT
 
-    # Cache-bust so we don't get stale CDN responses
-    cb = int(time.time() * 1000)
-    fetch_url = f"{url}?cb={cb}"
-
     try:
-        r = requests.get(
-            fetch_url,
-            timeout=10,
-            headers={"Cache-Control": "no-cache", "Accept": "application/json"},
-        )
-        r.raise_for_status()
-        dataset = r.json()
+        dataset = DATASETS.get(url)
     except Exception as e:
         return jsonify({"ok": 0, "err": f"fetch_failed: {e}"}), 200
 
@@ -192,10 +219,7 @@ def admin_set_cert():
 
     rec = {"ok": int(bool(ok)), "std": std, "sub": sub}
 
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        cache.setdefault("cert_by_issuer", {})[issuer_id] = rec
-        _save_cache(cache)
+    ORACLE.set("cert_by_issuer", issuer_id, rec)
 
     return jsonify({"ok": 1, "issuer_id": int(issuer_id), "record": rec})
 
@@ -217,10 +241,7 @@ def admin_set_price():
 
     rec = {"ok": 1, "sku": sku, "jpykg": round(jpykg_f, 2)}
 
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        cache.setdefault("price_by_issuer", {})[issuer_id] = rec
-        _save_cache(cache)
+    ORACLE.set("price_by_issuer", issuer_id, rec)
 
     return jsonify({"ok": 1, "issuer_id": int(issuer_id), "record": rec})
 
@@ -232,9 +253,7 @@ def admin_refresh_from_dataset():
         return jsonify({"ok": 0, "err": "missing_or_invalid_url"}), 400
 
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        payload = r.json()
+        payload = _fetch_dataset(url)
     except Exception as e:
         return jsonify({"ok": 0, "err": f"fetch_failed: {e}"}), 500
 
@@ -244,21 +263,30 @@ def admin_refresh_from_dataset():
     if not isinstance(certs, dict) or not isinstance(prices, dict):
         return jsonify({"ok": 0, "err": "invalid_payload_shape"}), 400
 
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        cache["cert_by_issuer"] = certs
-        cache["price_by_issuer"] = prices
-        _save_cache(cache)
-
-    return jsonify({"ok": 1, "cert_count": len(certs), "price_count": len(prices)})
+    # Canonical hash: an unchanged dataset is detected without diffing
+    canonical = json.dumps({"cert_by_issuer": certs, "price_by_issuer": prices},
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    dataset_hash = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    report = ORACLE.replace(certs, prices, source_hash=dataset_hash)
+
+    out = {
+        "ok": 1,
+        "cert_count": len(certs),
+        "price_count": len(prices),
+        "dataset_sha256": dataset_hash,
+        "skipped": report["skipped"],
+        "changed_ids": report["changed_ids"],
+    }
+    for kind in ("cert_by_issuer", "price_by_issuer"):
+        if kind in report:
+            out[kind.replace("_by_issuer", "")] = {k: len(v) for k, v in report[kind].items()}
+    return jsonify(out)
 
 def _fetch_dataset(url: str):
-    # cache-bust so GitHub raw updates show immediately
-    bust = int(time.time() * 1000)
-    full_url = f"{url}?cb={bust}"
-    r = requests.get(full_url, timeout=10, headers={"Cache-Control": "no-cache"})
-    r.raise_for_status()
-    return r.json()
+    # Always revalidated (max_age=0) so GitHub raw updates show immediately;
+    # concurrent refreshes of the same URL share one download
+    return DATASETS.get(url, max_age=0)
 
 @api.post("/api/v1/admin/refresh_cert_one")
 def admin_refresh_cert_one():
@@ -277,10 +305,7 @@ def admin_refresh_cert_one():
     if not rec:
         return jsonify({"ok": 0, "err": "no_cert_record_in_dataset"}), 404
 
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        cache.setdefault("cert_by_issuer", {})[issuer_id] = rec
-        _save_cache(cache)
+    ORACLE.set("cert_by_issuer", issuer_id, rec)
 
     return jsonify({"ok": 1, "issuer_id": int(issuer_id), "record": rec})
 
@@ -301,39 +326,131 @@ def admin_refresh_price_one():
     if not rec:
         return jsonify({"ok": 0, "err": "no_price_record_in_dataset"}), 404
 
-    with _CACHE_LOCK:
-        cache = _load_cache()
-        cache.setdefault("price_by_issuer", {})[issuer_id] = rec
-        _save_cache(cache)
+    ORACLE.set("price_by_issuer", issuer_id, rec)
 
     return jsonify({"ok": 1, "issuer_id": int(issuer_id), "record": rec})
 
+@api.post("/api/v1/admin/refresh_many")
+def admin_refresh_many():
+    # Refresh cert/price for many issuers from ONE dataset download.
+    # Body (or query): {"url": "...", "issuer_ids": [1, 2] | "1,2", "fields": "cert,price"}
+    # Omitting issuer_ids refreshes every issuer present in the dataset.
+    data = request.get_json(force=True, silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"ok": 0, "err": "invalid_body"}), 400
+    url = str(data.get("url") or request.args.get("url", "")).strip() or DATASET_URL_DEFAULT
+
+    raw_ids = data.get("issuer_ids", request.args.get("issuer_ids", ""))
+    if isinstance(raw_ids, str):
+        raw_ids = [i for i in raw_ids.split(",") if i.strip()]
+    elif not isinstance(raw_ids, list):
+        return jsonify({"ok": 0, "err": "invalid_issuer_ids"}), 400
+    ids = [str(i).strip() for i in raw_ids]
+    if not all(i.isdigit() for i in ids):
+        return jsonify({"ok": 0, "err": "invalid_issuer_ids"}), 400
+    wanted = {str(int(i)) for i in ids}
+
+    fields = data.get("fields", request.args.get("fields", "")) or "cert,price"
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    elif not isinstance(fields, list):
+        return jsonify({"ok": 0, "err": "invalid_fields"}), 400
+    if not fields or any(f not in ("cert", "price") for f in fields):
+        return jsonify({"ok": 0, "err": "invalid_fields"}), 400
+
+    try:
+        dataset = _fetch_dataset(url)
+    except Exception as e:
+        return jsonify({"ok": 0, "err": f"fetch_failed: {e}"}), 500
+
+    updates = {}
+    for field in fields:
+        kind = f"{field}_by_issuer"
+        recs = dataset.get(kind) or {}
+        if not isinstance(recs, dict):
+            return jsonify({"ok": 0, "err": "invalid_payload_shape"}), 400
+        updates[kind] = {k: v for k, v in recs.items() if not wanted or k in wanted}
+
+    report = ORACLE.apply(updates)
+
+    out = {"ok": 1}
+    for kind, r in report.items():
+        field = kind.replace("_by_issuer", "")
+        out[field] = {
+            "added": len(r["added"]),
+            "changed": len(r["changed"]),
+            "unchanged": r["unchanged"],
+            "updated_ids": sorted(r["added"] + r["changed"], key=id_order),
+        }
+    if wanted:
+        found = {k for recs in updates.values() for k in recs}
+        out["missing_ids"] = sorted(wanted - found, key=id_order)
+    return jsonify(out)
+
+def _chainlink_client():
+    """
+    Import functions_request.py from CHAINLINK_FUNCTIONS_DIR (which also
+    holds its .env and functions/source.js) and build the shared client.
+    """
+    global _CHAINLINK
+    with _CHAINLINK_LOCK:
+        if _CHAINLINK is None:
+            functions_dir = os.path.expanduser(CHAINLINK_FUNCTIONS_DIR)
+            if functions_dir not in sys.path:
+                sys.path.insert(0, functions_dir)
+            try:
+                import functions_request
+            except ImportError as e:
+                raise JobError(f"sender_unavailable: {e}")
+            try:
+                _CHAINLINK = functions_request.FunctionsClient.from_env(
+                    source_path=os.path.join(functions_dir, "functions", "source.js")
+                )
+            except functions_request.FunctionsError as e:
+                raise JobError(f"sender_failed: {json.dumps(e.payload)}")
+        return _CHAINLINK
+
+
+def _run_chainlink_price(args: dict) -> dict:
+    """Job runner: one Chainlink Functions price request on the warm client."""
+    issuer_id = int(args["issuer_id"])
+    client = _chainlink_client()
+
+    import functions_request
+
+    try:
+        return client.run(["price", str(issuer_id)], timeout_s=CHAINLINK_TIMEOUT_S)
+    except functions_request.FunctionsError as e:
+        raise JobError(f"sender_failed: {json.dumps(e.payload)}")
+
+
+JOBS.register("chainlink_price", _run_chainlink_price)
+
+
 @api.post("/api/v1/admin/trigger_chainlink_price")
 def trigger_chainlink_price():
-    # Called by listings.html refresh button.
+    # Called by listings.html refresh button. Enqueues the Functions request
+    # and returns at once; poll /api/v1/admin/jobs/<job_id> for the result.
     issuer_id = request.args.get("issuer_id", "").strip()
     if not issuer_id.isdigit():
         return jsonify({"ok": 0, "err": "invalid_issuer_id"}), 400
 
-    # Call your working Python sender (chainlink-functions-jp)
-    # Adjust the path if your folder is elsewhere.
-    cmd = [
-        "bash", "-lc",
-        f"cd ~/chainlink-functions-jp && source .venv/bin/activate && python3 functions_request.py -- price {issuer_id}"
-    ]
-
-    try:
-        p = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-    except subprocess.TimeoutExpired:
-        return jsonify({"ok": 0, "err": "chainlink_timeout"}), 504
-
-    if p.returncode != 0:
-        return jsonify({"ok": 0, "err": "sender_failed", "stderr": p.stderr[-1000:]}), 500
-
-    # functions_request.py prints JSON to stdout
     try:
-        out = json.loads(p.stdout.strip().splitlines()[-1])
-    except Exception:
-        return jsonify({"ok": 0, "err": "bad_sender_output", "stdout": p.stdout[-1000:]}), 500
+        job = JOBS.enqueue("chainlink_price", {"issuer_id": int(issuer_id)})
+    except QueueFull:
+        return jsonify({"ok": 0, "err": "queue_full"}), 429
 
-    return jsonify(out), 200
\ No newline at end of file
+    return jsonify({
+        "ok": 1,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/api/v1/admin/jobs/{job['job_id']}",
+    }), 202
+
+
+@api.get("/api/v1/admin/jobs/<job_id>")
+def admin_job_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"ok": 0, "err": "job_not_found"}), 404
+    return jsonify({"ok": 1, **job})
@@ -3,20 +3,51 @@
 Python-only Chainlink Functions request runner (Sepolia)
 
 - Reads Functions JS source from functions/source.js (plain text)
-- Calls consumer.setSource(source)
+- Calls consumer.setSource(source), unless the consumer already has it
 - Calls consumer.sendRequest(subscriptionId, args)
-- Polls for consumer's Response event
+- Waits for the consumer's Response event carrying our requestId
 - Prints one-line JSON to stdout
 
+FunctionsClient holds the provider, account and contract so a long-running
+process (the HashiRWA Flask app) can import it once and reuse the warm
+connection for every request; main() is a thin CLI wrapper around it.
+
+The sha256 of the last source successfully set on each consumer is kept in
+.source_hash.json next to source.js, so setSource is only sent when the
+file actually changed (or with --force-source). With
+VERIFY_SOURCE_ON_CHAIN=1 the recorded setSource transaction is checked on
+chain once per process before it is trusted.
+
+Batch mode submits many requests over the same connection and prints one
+NDJSON line per issuer as each Response arrives:
+
+  python3 functions_request.py --batch -- price:1 price:2 cert:7
+
+Responses are matched on the requestId from the RequestSent event in the
+sendRequest receipt. One ResponseTracker per client polls only the blocks
+added since its last query, filtered on the waiting requestIds, and hands
+each event to the caller waiting for it.
+
+Receipt and Response polls follow a PollSchedule: tight right after the
+broadcast, then exponential backoff with jitter, snapped to just after the
+next block once the BlockClock has seen the chain's cadence. Poll counts
+and wait latencies are kept in METRICS (see poll_stats()).
+
 Dependencies:
   pip install web3 python-dotenv
 """
 
+import hashlib
 import json
 import os
+import random
+import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from web3 import Web3
@@ -24,10 +55,34 @@ from web3.exceptions import ContractLogicError, TransactionNotFound
 
 load_dotenv()
 
-SEPOLIA_RPC_URL = os.environ.get("SEPOLIA_RPC_URL", "").strip()
-PRIVATE_KEY = os.environ.get("PRIVATE_KEY", "").strip()
-CONSUMER_ADDRESS_RAW = os.environ.get("CONSUMER_ADDRESS", "").strip()
-SUBSCRIPTION_ID_RAW = os.environ.get("SUBSCRIPTION_ID", "").strip()
+SEPOLIA_CHAIN_ID = 11155111
+TX_GAS = 700_000
+RESPONSE_TIMEOUT_S = 10 * 60
+
+# keccak256("RequestSent(bytes32)"), emitted by FunctionsClient.sendRequest
+REQUEST_SENT_TOPIC = Web3.to_hex(Web3.keccak(text="RequestSent(bytes32)"))
+
+# Most blocks per get_logs call
+MAX_LOG_RANGE = 1000
+
+# Poll scheduling: first delay, backoff factor, +/- jitter fraction, the
+# expected block time until one is observed, and how long after a block's
+# timestamp it is safe to expect it from the RPC
+POLL_INITIAL_S = 0.5
+POLL_FACTOR = 1.6
+POLL_JITTER = 0.2
+SEPOLIA_BLOCK_S = 12.0
+BLOCK_MARGIN_S = 1.0
+
+# Request modes accepted in --batch items (<mode>:<issuer_id>)
+BATCH_MODES = ("price", "cert")
+
+# Concurrent Response waiters in run_many (web3's HTTP pool holds 10)
+BATCH_WORKERS = int(os.environ.get("FUNCTIONS_BATCH_WORKERS", "8"))
+
+# Node errors meaning our local nonce was stale, not that the tx is bad
+# (a plain "transaction underpriced" is a fee problem and is not retried)
+NONCE_ERRORS = ("nonce too low", "replacement transaction underpriced")
 
 # Minimal ABI: only what we call + event we listen for
 ABI = [
@@ -61,26 +116,171 @@ ABI = [
 ]
 
 
+class FunctionsError(Exception):
+    """A failed request; `payload` is the one-line JSON the CLI prints."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        super().__init__(payload.get("error") or payload.get("stage") or "functions_request failed")
+        self.payload = {"ok": False, **payload}
+
+
 def fail(payload: Dict[str, Any], exit_code: int = 1) -> None:
     print(json.dumps(payload))
     raise SystemExit(exit_code)
 
 
-def wait_for_receipt(w3: Web3, tx_hash: bytes, timeout_s: int = 300) -> Dict[str, Any]:
-    """Poll for a transaction receipt. Handles providers that raise TransactionNotFound."""
+class PollMetrics:
+    """Per-kind poll counts and wait latencies (receipt, response)."""
+
+    def __init__(self, keep: int = 512):
+        self._lock = Lock()
+        self._keep = keep
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, kind: str, polls: int, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            d = self._data.setdefault(
+                kind, {"waits": 0, "polls": 0, "timeouts": 0, "latencies": deque(maxlen=self._keep)}
+            )
+            d["waits"] += 1
+            d["polls"] += polls
+            d["timeouts"] += int(timed_out)
+            if not timed_out:
+                d["latencies"].append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        out = {}
+        with self._lock:
+            for kind, d in self._data.items():
+                lat = sorted(d["latencies"])
+                out[kind] = {
+                    "waits": d["waits"],
+                    "polls": d["polls"],
+                    "polls_per_wait": round(d["polls"] / d["waits"], 2),
+                    "timeouts": d["timeouts"],
+                    "p50_s": round(lat[len(lat) // 2], 2) if lat else None,
+                    "p95_s": round(lat[int(len(lat) * 0.95)], 2) if lat else None,
+                    "max_s": round(lat[-1], 2) if lat else None,
+                }
+        return out
+
+
+METRICS = PollMetrics()
+
+
+def poll_stats() -> Dict[str, Any]:
+    """Receipt/Response poll counts and latency percentiles for this process."""
+    return METRICS.snapshot()
+
+
+class BlockClock:
+    """
+    Estimates when the next block will appear from observed block
+    timestamps (EWMA of seconds per block; SEPOLIA_BLOCK_S until seen).
+    """
+
+    def __init__(self, block_s: float = SEPOLIA_BLOCK_S):
+        self._lock = Lock()
+        self.block_s = block_s
+        self._number: Optional[int] = None
+        self._timestamp: Optional[float] = None
+
+    def observe(self, number: int, timestamp: float) -> None:
+        with self._lock:
+            if self._number is not None and number > self._number:
+                per_block = (timestamp - self._timestamp) / (number - self._number)
+                if per_block > 0:
+                    self.block_s = 0.8 * self.block_s + 0.2 * per_block
+            if self._number is None or number > self._number:
+                self._number, self._timestamp = number, timestamp
+
+    @property
+    def known(self) -> bool:
+        return self._timestamp is not None
+
+    def eta(self) -> Optional[float]:
+        """Seconds until the next block should be visible, or None if unknown."""
+        with self._lock:
+            if self._timestamp is None:
+                return None
+            since = time.time() - self._timestamp
+            # blocks may have been mined since we last looked
+            remaining = self.block_s - since % self.block_s
+        return remaining + BLOCK_MARGIN_S
+
+
+class PollSchedule:
+    """
+    Delays between polls: POLL_INITIAL_S growing by POLL_FACTOR with
+    jitter, capped at one block. With a BlockClock the delay is pushed out
+    to just after a block boundary, since nothing changes in between.
+    """
+
+    def __init__(
+        self,
+        clock: Optional[BlockClock] = None,
+        initial: float = POLL_INITIAL_S,
+        factor: float = POLL_FACTOR,
+        jitter: float = POLL_JITTER,
+    ):
+        self.clock = clock
+        self.initial = initial
+        self.factor = factor
+        self.jitter = jitter
+        self.polls = 0
+
+    def reset(self) -> None:
+        self.polls = 0
+
+    def next_delay(self) -> float:
+        cap = self.clock.block_s if self.clock else SEPOLIA_BLOCK_S
+        delay = min(cap, self.initial * self.factor ** self.polls)
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.polls += 1
+
+        eta = self.clock.eta() if self.clock else None
+        if eta is not None and delay > BLOCK_MARGIN_S:
+            # block boundary nearest to the backoff delay
+            block_s = self.clock.block_s
+            while eta < delay - block_s / 2:
+                eta += block_s
+            delay = eta
+        return delay
+
+
+def wait_for_receipt(
+    w3: Web3, tx_hash: bytes, timeout_s: int = 300, clock: Optional[BlockClock] = None
+) -> Dict[str, Any]:
+    """
+    Poll for a transaction receipt. Handles providers that raise TransactionNotFound.
+    With a clock that has not seen a block yet (e.g. the first tx of a CLI
+    run), the latest block seeds it so polls align with block arrivals.
+    """
     start = time.time()
+    if clock is not None and not clock.known:
+        try:
+            block = w3.eth.get_block("latest")
+            clock.observe(int(block["number"]), float(block["timestamp"]))
+        except Exception:
+            pass  # fall back to plain backoff
+    schedule = PollSchedule(clock)
+    polls = 0
     while True:
+        polls += 1
         try:
             receipt = w3.eth.get_transaction_receipt(tx_hash)
             if receipt is not None:
+                METRICS.record("receipt", polls, time.time() - start)
                 return dict(receipt)
         except TransactionNotFound:
             pass
 
-        if time.time() - start > timeout_s:
+        elapsed = time.time() - start
+        if elapsed > timeout_s:
+            METRICS.record("receipt", polls, elapsed, timed_out=True)
             raise TimeoutError(f"Timed out waiting for tx receipt: {tx_hash.hex()}")
 
-        time.sleep(2)
+        time.sleep(min(schedule.next_delay(), max(timeout_s - elapsed, 0.1)))
 
 
 def build_fees(w3: Web3) -> Dict[str, int]:
@@ -103,184 +303,522 @@ def build_fees(w3: Web3) -> Dict[str, int]:
 
 
 def send_tx(w3: Web3, account, tx: Dict[str, Any]) -> bytes:
-    signed = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
+    signed = w3.eth.account.sign_transaction(tx, account.key)
     # Version-robust: web3.py may use raw_transaction (new) or rawTransaction (old)
     raw = getattr(signed, "rawTransaction", None) or getattr(signed, "raw_transaction")
-    return w3.eth.send_raw_transaction(raw)
+    try:
+        return w3.eth.send_raw_transaction(raw)
+    except Exception as e:
+        # This exact signed tx is already in the mempool: the broadcast worked
+        if "already known" in str(e).lower():
+            return signed.hash
+        raise
 
 
-def main(argv: Optional[List[str]] = None) -> None:
-    if not SEPOLIA_RPC_URL:
-        fail({"ok": False, "error": "Missing SEPOLIA_RPC_URL in .env"})
+def to_hex32(value) -> str:
+    """0x-prefixed lowercase hex for a bytes32 / topic, whatever web3 returns."""
+    if isinstance(value, str):
+        return value.lower() if value.startswith("0x") else "0x" + value.lower()
+    return "0x" + bytes(value).hex()
 
-    if not PRIVATE_KEY:
-        fail({"ok": False, "error": "Missing PRIVATE_KEY in .env"})
 
-    if not PRIVATE_KEY.startswith("0x"):
-        # MetaMask often exports without 0x; add it if missing
-        PRIVATE_KEY_FIXED = "0x" + PRIVATE_KEY
-    else:
-        PRIVATE_KEY_FIXED = PRIVATE_KEY
+class ResponseTracker:
+    """
+    Single poller for a consumer's Response events, shared by all waiters.
+
+    Every waiter keeps the next block it still needs scanned. Each poll
+    asks only for blocks from the lowest of those (in chunks of at most
+    MAX_LOG_RANGE) and only for the requestIds someone is waiting on, via
+    the indexed topic, so in steady state only newly mined blocks are
+    queried. Events are routed to their waiter by requestId; the polling
+    thread exits when nobody is waiting. Polls are paced by a PollSchedule
+    (reset whenever a new request starts waiting) and each one feeds the
+    latest block's timestamp to the BlockClock.
+    """
 
-    # Update module-level for send_tx
-    globals()["PRIVATE_KEY"] = PRIVATE_KEY_FIXED
+    def __init__(self, w3: Web3, contract, clock: Optional[BlockClock] = None):
+        self.w3 = w3
+        self.contract = contract
+        self.clock = clock or BlockClock()
+        self.schedule = PollSchedule(self.clock)
+        self.event_sig = Web3.to_hex(w3.keccak(text="Response(bytes32,string,bytes)"))
+        self._lock = Lock()
+        self._waiters: Dict[str, Dict[str, Any]] = {}
+        self._thread: Optional[Thread] = None
+
+    def wait(self, request_id: str, from_block: int, timeout_s: float) -> Any:
+        """Block until the Response for `request_id` arrives; returns the decoded event."""
+        request_id = to_hex32(request_id)
+        waiter = {"event": Event(), "log": None, "next": from_block, "polls": 0}
+        start = time.time()
+        with self._lock:
+            self._waiters[request_id] = waiter
+            self.schedule.reset()
+            if self._thread is None:
+                self._thread = Thread(target=self._poll, daemon=True)
+                self._thread.start()
+        try:
+            if not waiter["event"].wait(timeout_s):
+                METRICS.record("response", waiter["polls"], time.time() - start, timed_out=True)
+                raise TimeoutError("Timed out waiting for Response event")
+            METRICS.record("response", waiter["polls"], time.time() - start)
+            return waiter["log"]
+        finally:
+            with self._lock:
+                self._waiters.pop(request_id, None)
+
+    def _poll(self) -> None:
+        while True:
+            with self._lock:
+                pending = {i: w for i, w in self._waiters.items() if w["log"] is None}
+                if not pending:
+                    self._thread = None
+                    return
+                for w in pending.values():
+                    w["polls"] += 1
+            try:
+                block = self.w3.eth.get_block("latest")
+                latest = int(block["number"])
+                self.clock.observe(latest, float(block["timestamp"]))
+                start = min(w["next"] for w in pending.values())
+                while start <= latest:
+                    end = min(latest, start + MAX_LOG_RANGE - 1)
+                    logs = self.w3.eth.get_logs(
+                        {
+                            "fromBlock": start,
+                            "toBlock": end,
+                            "address": self.contract.address,
+                            "topics": [self.event_sig, list(pending)],
+                        }
+                    )
+                    self._dispatch(logs)
+                    with self._lock:
+                        for w in pending.values():
+                            w["next"] = max(w["next"], end + 1)
+                    start = end + 1
+            except Exception:
+                pass  # transient RPC error: retry the same range next poll
+            with self._lock:
+                delay = self.schedule.next_delay()
+            time.sleep(delay)
+
+    def _dispatch(self, logs: List[Any]) -> None:
+        for log in logs:
+            evt = self.contract.events.Response().process_log(log)
+            with self._lock:
+                waiter = self._waiters.get(to_hex32(evt["args"]["requestId"]))
+                if waiter is not None and waiter["log"] is None:
+                    waiter["log"] = evt
+                    waiter["event"].set()
+
+
+class NonceManager:
+    """
+    Hands out sequential nonces for one account without an RPC per tx.
+
+    The first allocation reads the pending transaction count; later ones
+    just increment it, so several transactions can be broadcast
+    back-to-back instead of waiting for each receipt. After a failed send
+    or a receipt timeout call resync(): the next allocation re-reads the
+    pending count, which also refills a nonce that never reached the
+    mempool.
+    """
 
-    if not CONSUMER_ADDRESS_RAW:
-        fail({"ok": False, "error": "Missing CONSUMER_ADDRESS in .env"})
+    def __init__(self, w3: Web3, address: str):
+        self.w3 = w3
+        self.address = address
+        self._lock = Lock()
+        self._next: Optional[int] = None
 
-    if not SUBSCRIPTION_ID_RAW:
-        fail({"ok": False, "error": "Missing SUBSCRIPTION_ID in .env"})
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
 
-    consumer_address = Web3.to_checksum_address(CONSUMER_ADDRESS_RAW)
-    subscription_id = int(SUBSCRIPTION_ID_RAW)
+    def resync(self) -> None:
+        with self._lock:
+            self._next = None
 
-    # Provider with timeout to reduce false negatives
-    w3 = Web3(Web3.HTTPProvider(SEPOLIA_RPC_URL, request_kwargs={"timeout": 30}))
 
-    # More reliable than is_connected(): query chain id
-    try:
-        chain_id = w3.eth.chain_id
-    except Exception as e:
-        fail({"ok": False, "error": f"RPC not responding: {e}"})
+class FunctionsClient:
+    """
+    Reusable Chainlink Functions sender.
+
+    The provider, account and contract are built once on first use and kept
+    for the life of the object; source.js is re-read only when its mtime
+    changes. run() is safe to call from several threads: nonces come from a
+    local NonceManager, so concurrent runs broadcast their sendRequest
+    transactions back-to-back and only the receipt and Response waits
+    overlap.
+    """
+
+    def __init__(
+        self,
+        rpc_url: str,
+        private_key: str,
+        consumer_address: str,
+        subscription_id: int,
+        source_path: str = "functions/source.js",
+        timeout_s: int = 30,
+        source_cache_path: Optional[str] = None,
+        verify_source: bool = False,
+    ):
+        if not private_key.startswith("0x"):
+            # MetaMask often exports without 0x; add it if missing
+            private_key = "0x" + private_key
+        self.rpc_url = rpc_url
+        self.consumer_address = Web3.to_checksum_address(consumer_address)
+        self.subscription_id = int(subscription_id)
+        self.source_path = Path(source_path)
+        self.timeout_s = timeout_s
+        self.source_cache_path = Path(source_cache_path or self.source_path.with_name(".source_hash.json"))
+        self.verify_source = verify_source
+        self._private_key = private_key
+        self._lock = Lock()
+        self._source_lock = Lock()
+        self._w3: Optional[Web3] = None
+        self._source: Optional[str] = None
+        self._source_mtime: Optional[float] = None
+        self._source_verified: Optional[str] = None
+
+    @classmethod
+    def from_env(cls, source_path: Optional[str] = None) -> "FunctionsClient":
+        """Build a client from SEPOLIA_RPC_URL, PRIVATE_KEY, CONSUMER_ADDRESS, SUBSCRIPTION_ID."""
+        env = {
+            name: os.environ.get(name, "").strip()
+            for name in ("SEPOLIA_RPC_URL", "PRIVATE_KEY", "CONSUMER_ADDRESS", "SUBSCRIPTION_ID")
+        }
+        for name, value in env.items():
+            if not value:
+                raise FunctionsError({"error": f"Missing {name} in .env"})
+        return cls(
+            env["SEPOLIA_RPC_URL"],
+            env["PRIVATE_KEY"],
+            env["CONSUMER_ADDRESS"],
+            int(env["SUBSCRIPTION_ID"]),
+            source_path=source_path or "functions/source.js",
+            verify_source=os.environ.get("VERIFY_SOURCE_ON_CHAIN", "").strip() == "1",
+        )
+
+    def connect(self) -> Web3:
+        """Open the provider once and check we are on Sepolia."""
+        with self._lock:
+            if self._w3 is not None:
+                return self._w3
+
+            # Provider with timeout to reduce false negatives
+            w3 = Web3(Web3.HTTPProvider(self.rpc_url, request_kwargs={"timeout": self.timeout_s}))
+
+            # More reliable than is_connected(): query chain id
+            try:
+                chain_id = w3.eth.chain_id
+            except Exception as e:
+                raise FunctionsError({"error": f"RPC not responding: {e}"})
+
+            if chain_id != SEPOLIA_CHAIN_ID:
+                raise FunctionsError({"error": f"Unexpected chain_id {chain_id}; expected {SEPOLIA_CHAIN_ID} (Sepolia)"})
+
+            self.chain_id = chain_id
+            self.account = w3.eth.account.from_key(self._private_key)
+            self.nonces = NonceManager(w3, self.account.address)
+            self.contract = w3.eth.contract(address=self.consumer_address, abi=ABI)
+            self.clock = BlockClock()
+            self.responses = ResponseTracker(w3, self.contract, self.clock)
+            self._w3 = w3
+            return w3
+
+    def source(self) -> str:
+        """Functions JS source, cached until the file changes."""
+        try:
+            mtime = self.source_path.stat().st_mtime
+        except FileNotFoundError:
+            raise FunctionsError({"error": f"{self.source_path} not found"})
+        with self._lock:
+            if self._source is None or mtime != self._source_mtime:
+                self._source = self.source_path.read_text(encoding="utf-8")
+                self._source_mtime = mtime
+            return self._source
+
+    def _load_source_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.source_cache_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def _save_source_state(self, state: Dict[str, Any]) -> None:
+        tmp = self.source_cache_path.with_name(self.source_cache_path.name + ".tmp")
+        tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(tmp, self.source_cache_path)
+
+    def _source_on_chain(self, record: Dict[str, Any]) -> bool:
+        """Check the recorded setSource tx succeeded and carried the same source."""
+        w3 = self._w3
+        try:
+            receipt = w3.eth.get_transaction_receipt(record["txHash"])
+            tx = w3.eth.get_transaction(record["txHash"])
+            _, params = self.contract.decode_function_input(tx["input"])
+        except Exception:
+            return False
+        sha = hashlib.sha256(params["newSource"].encode("utf-8")).hexdigest()
+        return receipt.get("status") == 1 and sha == record.get("sha256")
+
+    def ensure_source(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Send setSource only if the consumer does not already run this source.
+        Returns {"sent": bool, "sha256", "txHash", "seconds" | "savedSeconds"}.
+        """
+        # Serialised so concurrent runs after an edit send one setSource, not several
+        with self._source_lock:
+            return self._ensure_source_locked(force)
+
+    def _ensure_source_locked(self, force: bool) -> Dict[str, Any]:
+        source = self.source()
+        sha = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        key = self.consumer_address
+
+        with self._lock:
+            record = self._load_source_state().get(key) or {}
+        if not force and record.get("sha256") == sha:
+            trusted = not self.verify_source or self._source_verified == sha
+            if not trusted and self._source_on_chain(record):
+                self._source_verified = sha
+                trusted = True
+            if trusted:
+                return {
+                    "sent": False,
+                    "sha256": sha,
+                    "txHash": record.get("txHash"),
+                    "savedSeconds": record.get("seconds"),
+                }
 
-    if chain_id != 11155111:
-        fail({"ok": False, "error": f"Unexpected chain_id {chain_id}; expected 11155111 (Sepolia)"})
+        started = time.time()
+        tx_hash, receipt = self._transact("setSource", self.contract.functions.setSource(source))
+        record = {
+            "sha256": sha,
+            "txHash": tx_hash.hex(),
+            "blockNumber": int(receipt["blockNumber"]),
+            "seconds": round(time.time() - started, 2),
+        }
+        with self._lock:
+            state = self._load_source_state()
+            state[key] = record
+            self._save_source_state(state)
+            self._source_verified = sha
+        return {"sent": True, **record}
+
+    def _broadcast(self, stage: str, fn) -> bytes:
+        """Sign and send one contract call with a locally allocated nonce."""
+        w3 = self._w3
+        for attempt in (1, 2):
+            nonce = self.nonces.allocate()
+            try:
+                tx = fn.build_transaction(
+                    {
+                        "from": self.account.address,
+                        "nonce": nonce,
+                        "chainId": self.chain_id,
+                        "gas": TX_GAS,
+                        **build_fees(w3),
+                    }
+                )
+                return send_tx(w3, self.account, tx)
+            except ContractLogicError as e:
+                self.nonces.resync()
+                raise FunctionsError({"stage": stage, "error": str(e)})
+            except Exception as e:
+                # The nonce was not used (or was stale): re-read the pending
+                # count and retry once if the node complained about it
+                self.nonces.resync()
+                if attempt == 2 or not any(m in str(e).lower() for m in NONCE_ERRORS):
+                    raise FunctionsError({"stage": stage, "error": str(e)})
+
+    def _confirm(self, stage: str, tx_hash: bytes) -> Dict[str, Any]:
+        """Wait for a broadcast transaction to be mined successfully."""
+        try:
+            receipt = wait_for_receipt(self._w3, tx_hash, clock=self.clock)
+        except Exception as e:
+            self.nonces.resync()
+            raise FunctionsError({"stage": stage, "txHash": tx_hash.hex(), "error": str(e)})
+
+        if receipt.get("status") != 1:
+            raise FunctionsError({"stage": stage, "txHash": tx_hash.hex(), "status": receipt.get("status")})
+        return receipt
+
+    def _transact(self, stage: str, fn) -> tuple:
+        """Send one contract call from our account and wait for it to be mined."""
+        tx_hash = self._broadcast(stage, fn)
+        return tx_hash, self._confirm(stage, tx_hash)
+
+    def run(
+        self, args: List[str], timeout_s: int = RESPONSE_TIMEOUT_S, force_source: bool = False
+    ) -> Dict[str, Any]:
+        """
+        setSource (when changed) + sendRequest(args), then wait for the
+        consumer's Response. Returns the result dict the CLI prints; raises
+        FunctionsError.
+        """
+        self.connect()
+
+        # 1) setSource, skipped when the consumer already has this source
+        set_source = self.ensure_source(force=force_source)
+
+        # 2) sendRequest
+        tx_hash = self.submit(args)
+
+        # 3) wait for Response event from consumer
+        return {**self.wait(tx_hash, timeout_s), "setSource": set_source}
+
+    def run_many(
+        self, requests: List[List[str]], timeout_s: int = RESPONSE_TIMEOUT_S, force_source: bool = False
+    ) -> Iterator[Tuple[List[str], Dict[str, Any]]]:
+        """
+        Fan out several requests: setSource once, broadcast every sendRequest
+        back-to-back, then wait for the Responses concurrently. Yields
+        (args, result) as each one finishes; failures yield the error payload.
+        """
+        self.connect()
+        try:
+            set_source = self.ensure_source(force=force_source)
+        except FunctionsError as e:
+            for args in requests:
+                yield args, e.payload
+            return
 
-    acct = w3.eth.account.from_key(PRIVATE_KEY_FIXED)
-    sender = acct.address
+        submitted = []
+        for args in requests:
+            try:
+                submitted.append((args, self.submit(args)))
+            except FunctionsError as e:
+                yield args, e.payload
 
-    contract = w3.eth.contract(address=consumer_address, abi=ABI)
+        if not submitted:
+            return
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(submitted))) as pool:
+            futures = {pool.submit(self.wait, tx_hash, timeout_s): args for args, tx_hash in submitted}
+            for future in as_completed(futures):
+                try:
+                    result = {**future.result(), "setSource": set_source}
+                except FunctionsError as e:
+                    result = e.payload
+                yield futures[future], result
+
+    def submit(self, args: List[str]) -> bytes:
+        """Broadcast sendRequest(args); returns the tx hash without waiting."""
+        self.connect()
+        fn = self.contract.functions.sendRequest(self.subscription_id, [str(a) for a in args])
+        return self._broadcast("sendRequest", fn)
+
+    def request_id(self, receipt: Dict[str, Any]) -> Optional[str]:
+        """requestId from the RequestSent(bytes32 indexed id) log in a sendRequest receipt."""
+        for log in receipt.get("logs") or []:
+            topics = log.get("topics") or []
+            if (
+                len(topics) > 1
+                and to_hex32(topics[0]) == REQUEST_SENT_TOPIC
+                and Web3.to_checksum_address(log.get("address")) == self.consumer_address
+            ):
+                return to_hex32(topics[1])
+        return None
+
+    def wait(self, tx_hash: bytes, timeout_s: int = RESPONSE_TIMEOUT_S) -> Dict[str, Any]:
+        """Wait for a submitted sendRequest to be mined and answered."""
+        receipt = self._confirm("sendRequest", tx_hash)
+        request_id = self.request_id(receipt)
+        if request_id is None:
+            raise FunctionsError(
+                {"stage": "sendRequest", "txHash": tx_hash.hex(), "error": "No RequestSent event in receipt"}
+            )
 
-    source_path = Path("functions/source.js")
-    if not source_path.exists():
-        fail({"ok": False, "error": "functions/source.js not found"})
+        try:
+            evt = self.responses.wait(request_id, int(receipt["blockNumber"]), timeout_s)
+        except TimeoutError as e:
+            raise FunctionsError(
+                {"stage": "waitForResponse", "txHash": tx_hash.hex(), "requestId": request_id, "error": str(e)}
+            )
 
-    source = source_path.read_text(encoding="utf-8")
+        response = evt["args"]["response"]
+        err_bytes = evt["args"]["err"]
 
-    # Args: optional CLI args after "--" (kept empty by default)
-    args: List[str] = []
-    if argv is None:
-        argv = []
-    if "--" in argv:
-        i = argv.index("--")
-        args = [str(a) for a in argv[i + 1 :]]
+        if isinstance(err_bytes, (bytes, bytearray)):
+            err_hex = "0x" + err_bytes.hex()
+        else:
+            err_hex = str(err_bytes)
 
-    fees = build_fees(w3)
+        return {
+            "ok": err_hex in ("0x", "0x00", "0x0000") or err_hex == "0x",
+            "txHash": tx_hash.hex(),
+            "requestId": request_id,
+            "response": response,
+            "err": err_hex,
+        }
 
-    # 1) setSource
-    try:
-        nonce = w3.eth.get_transaction_count(sender)
-        tx1 = contract.functions.setSource(source).build_transaction(
-            {
-                "from": sender,
-                "nonce": nonce,
-                "chainId": chain_id,
-                "gas": 700_000,
-                **fees,
-            }
-        )
-        tx_hash1 = send_tx(w3, acct, tx1)
-        receipt1 = wait_for_receipt(w3, tx_hash1)
-        if receipt1.get("status") != 1:
-            fail(
-                {
-                    "ok": False,
-                    "stage": "setSource",
-                    "txHash": tx_hash1.hex(),
-                    "status": receipt1.get("status"),
-                }
-            )
-    except ContractLogicError as e:
-        fail({"ok": False, "stage": "setSource", "error": str(e)})
-    except Exception as e:
-        fail({"ok": False, "stage": "setSource", "error": str(e)})
 
-    # 2) sendRequest
-    try:
-        nonce = w3.eth.get_transaction_count(sender)
-        tx2 = contract.functions.sendRequest(subscription_id, args).build_transaction(
-            {
-                "from": sender,
-                "nonce": nonce,
-                "chainId": chain_id,
-                "gas": 700_000,
-                **fees,
-            }
-        )
-        tx_hash2 = send_tx(w3, acct, tx2)
-        receipt2 = wait_for_receipt(w3, tx_hash2)
-        if receipt2.get("status") != 1:
-            fail(
-                {
-                    "ok": False,
-                    "stage": "sendRequest",
-                    "txHash": tx_hash2.hex(),
-                    "status": receipt2.get("status"),
-                }
-            )
-    except ContractLogicError as e:
-        fail({"ok": False, "stage": "sendRequest", "error": str(e)})
-    except Exception as e:
-        fail({"ok": False, "stage": "sendRequest", "error": str(e)})
+def parse_batch(tokens: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    ["price:1", "cert:7", "3"] -> [("1", ["price", "1"]), ...]; bare ids mean
+    price. Raises ValueError on an unknown mode or a non-numeric id.
+    """
+    out = []
+    for token in tokens:
+        mode, _, issuer_id = token.rpartition(":")
+        mode = mode or "price"
+        if mode not in BATCH_MODES or not issuer_id.isdigit():
+            raise ValueError(f"Bad batch item {token!r}; expected <{'|'.join(BATCH_MODES)}>:<issuer_id>")
+        out.append((issuer_id, [mode, issuer_id]))
+    return out
 
-    # 3) wait for Response event from consumer
-    start_block = int(receipt2["blockNumber"])
-    timeout_s = 10 * 60
-    start_time = time.time()
 
-    event_sig = w3.keccak(text="Response(bytes32,string,bytes)").hex()
+def main_batch(tokens: List[str], force_source: bool = False) -> None:
+    try:
+        items = parse_batch(tokens)
+    except ValueError as e:
+        fail({"ok": False, "error": str(e)}, exit_code=2)
+    if not items:
+        fail({"ok": False, "error": "No requests given; use --batch -- price:<id> ..."}, exit_code=2)
 
-    while True:
-        if time.time() - start_time > timeout_s:
-            fail(
-                {
-                    "ok": False,
-                    "stage": "waitForResponse",
-                    "txHash": tx_hash2.hex(),
-                    "error": "Timed out waiting for Response event",
-                }
-            )
+    try:
+        client = FunctionsClient.from_env()
+    except FunctionsError as e:
+        fail(e.payload)
 
-        latest = w3.eth.block_number
-        try:
-            logs = w3.eth.get_logs(
-                {
-                    "fromBlock": start_block,
-                    "toBlock": latest,
-                    "address": consumer_address,
-                    "topics": [event_sig],
-                }
-            )
-        except Exception:
-            logs = []
+    failed = 0
+    ids = {tuple(args): issuer_id for issuer_id, args in items}
+    for args, result in client.run_many([args for _, args in items], force_source=force_source):
+        failed += not result.get("ok")
+        line = {"issuer_id": ids[tuple(args)], "mode": args[0], **result}
+        print(json.dumps(line), flush=True)
+    print(json.dumps({"poll_stats": poll_stats()}), file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
 
-        if logs:
-            evt = contract.events.Response().process_log(logs[0])
-            request_id = evt["args"]["requestId"].hex()
-            response = evt["args"]["response"]
-            err_bytes = evt["args"]["err"]
 
-            if isinstance(err_bytes, (bytes, bytearray)):
-                err_hex = "0x" + err_bytes.hex()
-            else:
-                err_hex = str(err_bytes)
+def main(argv: Optional[List[str]] = None) -> None:
+    # Args: optional CLI args after "--" (kept empty by default)
+    args: List[str] = []
+    if argv is None:
+        argv = []
+    if "--" in argv:
+        i = argv.index("--")
+        args = [str(a) for a in argv[i + 1 :]]
+        argv = argv[:i]
 
-            print(
-                json.dumps(
-                    {
-                        "ok": err_hex in ("0x", "0x00", "0x0000") or err_hex == "0x",
-                        "txHash": tx_hash2.hex(),
-                        "requestId": request_id,
-                        "response": response,
-                        "err": err_hex,
-                    }
-                )
-            )
-            return
+    if "--batch" in argv:
+        main_batch(args, force_source="--force-source" in argv)
+        return
+
+    try:
+        client = FunctionsClient.from_env()
+        result = client.run(args, force_source="--force-source" in argv)
+    except FunctionsError as e:
+        fail(e.payload)
 
-        time.sleep(3)
+    print(json.dumps(result))
 
 
 if __name__ == "__main__":
-    import sys
     main(sys.argv[1:])
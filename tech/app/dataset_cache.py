@@ -0,0 +1,175 @@
+"""
+Local cache for the remote oracle dataset (GitHub raw JSON).
+
+cl_price() used to download and parse the dataset on every Chainlink
+request. DatasetCache keeps the parsed dataset per URL:
+
+- younger than `ttl`: served straight from memory
+- older, but within `ttl + stale_ttl`: served immediately while one
+  background thread revalidates it (stale-while-revalidate)
+- older than that (or first use): revalidated synchronously
+
+Revalidation is a conditional GET (If-None-Match / If-Modified-Since), so
+an unchanged dataset costs a 304 and no JSON parse. If revalidation fails
+and a previous copy exists, that copy is served (stale-if-error) — but
+only to callers that did not ask for a freshness bound; get(max_age=...)
+raises instead, so admin refreshes still report the failed download.
+
+Fetches are single-flight per URL: when the scheduler or several refresh
+buttons ask at the same moment, one caller downloads and parses and the
+others wait for and share its result.
+
+TTLs come from HASHIRWA_DATASET_TTL / HASHIRWA_DATASET_STALE_TTL (seconds).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from threading import Event, Lock, Thread
+
+import http_client
+
+log = logging.getLogger(__name__)
+
+DATASET_TTL = float(os.environ.get("HASHIRWA_DATASET_TTL", "30"))
+DATASET_STALE_TTL = float(os.environ.get("HASHIRWA_DATASET_STALE_TTL", "300"))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls per key: one runs, the rest share its outcome."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: dict = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class _Entry:
+    __slots__ = ("data", "etag", "last_modified", "fetched_at", "refreshing")
+
+    def __init__(self):
+        self.data = None
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = 0.0
+        self.refreshing = False
+
+
+class DatasetCache:
+    def __init__(self, ttl: float = DATASET_TTL, stale_ttl: float = DATASET_STALE_TTL,
+                 max_entries: int = 32):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries: dict[str, _Entry] = {}
+        self._flight = SingleFlight()
+
+    def get(self, url: str, max_age: float | None = None):
+        """
+        Parsed dataset for `url`. `max_age` tightens freshness for callers
+        that need a just-checked copy (max_age=0 always revalidates); those
+        callers get the fetch error rather than a stale copy.
+        """
+        entry = self._entry(url)
+        age = time.monotonic() - entry.fetched_at
+        if entry.data is not None:
+            if age < self.ttl and (max_age is None or age <= max_age):
+                return entry.data
+            if max_age is None and age < self.ttl + self.stale_ttl:
+                self._revalidate_in_background(url, entry)
+                return entry.data
+        return self._revalidate(url, entry, strict=max_age is not None)
+
+    def _entry(self, url: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    oldest = min(self._entries, key=lambda u: self._entries[u].fetched_at)
+                    del self._entries[oldest]
+                entry = self._entries[url] = _Entry()
+            return entry
+
+    def _revalidate_in_background(self, url: str, entry: _Entry) -> None:
+        with self._lock:
+            if entry.refreshing:
+                return
+            entry.refreshing = True
+
+        def run():
+            try:
+                self._revalidate(url, entry)
+            except Exception as e:
+                log.warning("dataset cache: background refresh of %s failed: %s", url, e)
+            finally:
+                entry.refreshing = False
+
+        Thread(target=run, daemon=True).start()
+
+    def _revalidate(self, url: str, entry: _Entry, strict: bool = False):
+        # strict and lenient callers differ on errors, so they don't share a flight
+        return self._flight.do((url, strict), lambda: self._fetch(url, entry, strict))
+
+    def _fetch(self, url: str, entry: _Entry, strict: bool = False):
+        headers = {"Cache-Control": "no-cache", "Accept": "application/json"}
+        if entry.data is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        # cache-bust so we don't get stale CDN responses
+        cb = int(time.time() * 1000)
+        try:
+            # pooled keep-alive session; timeout/retries per http_client
+            r = http_client.get(f"{url}?cb={cb}", headers=headers)
+            if r.status_code == 304 and entry.data is not None:
+                entry.fetched_at = time.monotonic()
+                return entry.data
+            r.raise_for_status()
+            data = r.json()
+        except Exception:
+            if entry.data is None or strict:
+                raise
+            log.warning("dataset cache: serving stale copy of %s", url, exc_info=True)
+            return entry.data
+
+        entry.data = data
+        entry.etag = r.headers.get("ETag")
+        entry.last_modified = r.headers.get("Last-Modified")
+        entry.fetched_at = time.monotonic()
+        return data
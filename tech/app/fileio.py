@@ -0,0 +1,65 @@
+"""
+File helpers shared by the JSON datastores (data.json, oracle_cache.json).
+
+atomic_write_json() never leaves a truncated file behind: the payload goes
+to a temp file in the same directory, is fsync'd, renamed over the target
+with os.replace() and the directory entry is fsync'd too. Readers (and
+other workers) therefore see either the old or the new file, never a mix.
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+
+
+def file_signature(path: str):
+    """Cheap change detector for a file: (mtime_ns, size, inode) or None."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def fsync_dir(path: str) -> None:
+    """Persist a rename/create in `path` (no-op where directories can't be opened)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Crash-safe replace of `path` with `data` (temp file + fsync + rename)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    fsync_dir(directory)
+
+
+def atomic_write_json(path: str, obj) -> None:
+    """Crash-safe JSON dump in the repo's on-disk format (UTF-8, indent=2)."""
+    atomic_write_bytes(path, json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"))
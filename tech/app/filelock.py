@@ -0,0 +1,77 @@
+"""
+Cross-process reader/writer lock on a sidecar file (fcntl.flock).
+
+Several gunicorn workers share data.json and oracle_cache.json; a
+threading.Lock only covers one process. FileLock gives shared() for
+readers and exclusive() for read-modify-write sections across processes
+and threads (every acquisition uses its own file descriptor, so threads in
+one process exclude each other too). Re-entrant per thread: a thread that
+already holds the lock may enter shared() or exclusive() again, except
+that a shared holder cannot upgrade to exclusive.
+
+Where fcntl is unavailable (Windows) it degrades to a process-local lock.
+"""
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+from threading import RLock, local
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+_SHARED = "shared"
+_EXCLUSIVE = "exclusive"
+
+
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._held = local()
+        self._fallback = RLock()
+
+    @contextmanager
+    def shared(self):
+        with self._hold(_SHARED):
+            yield
+
+    @contextmanager
+    def exclusive(self):
+        with self._hold(_EXCLUSIVE):
+            yield
+
+    @contextmanager
+    def _hold(self, mode: str):
+        held = getattr(self._held, "mode", None)
+        if held is not None:
+            if held == _SHARED and mode == _EXCLUSIVE:
+                raise RuntimeError(f"cannot upgrade shared lock on {self.path} to exclusive")
+            self._held.depth += 1
+            try:
+                yield
+            finally:
+                self._held.depth -= 1
+            return
+
+        if fcntl is None:
+            with self._fallback:
+                self._held.mode, self._held.depth = mode, 1
+                try:
+                    yield
+                finally:
+                    self._held.mode = None
+            return
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH if mode == _SHARED else fcntl.LOCK_EX)
+            self._held.mode, self._held.depth = mode, 1
+            try:
+                yield
+            finally:
+                self._held.mode = None
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
@@ -1,5 +1,6 @@
 from flask import (
     Flask,
+    Response,
     render_template,
     request,
     redirect,
@@ -7,10 +8,11 @@ from flask import (
     jsonify,
     flash,
 )
-import json
-import os
-from datetime import datetime
+import hashlib
+from datetime import datetime, timezone
 from api_endpoints import api
+from issuer_store import IssuerStore
+from storage import make_storage
 
 app = Flask(__name__)
 app.secret_key = "hashirwa-demo-secret"  # for flash() messages
@@ -22,42 +24,121 @@ DB_PATH = "data/data.json"
 # Allowed listing statuses
 ALLOWED_STATUSES = {"pending", "approved", "rejected"}
 
+# Cursor pagination for list views
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+FILTER_FIELDS = ("prefecture", "category", "certification")
+
+# Client/CDN cache lifetime for /metadata responses (seconds)
+METADATA_MAX_AGE = 60
+
 # ---------- Helper functions ----------
 
 
+# Process-wide cache of the parsed datastore (reloads only when storage changes)
+# Backend is chosen via HASHIRWA_STORAGE=json|sqlite (see storage.py)
+STORE = IssuerStore(make_storage(DB_PATH))
+
+
 def load_db():
-    """Load issuers list from JSON file. Always returns a list."""
-    if not os.path.exists(DB_PATH):
-        save_db([])  # create empty list file
-        return []
-    with open(DB_PATH, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            data = []
-    if not isinstance(data, list):
-        # normalize to list
-        data = []
-        save_db(data)
-    return data
+    """Load issuers list (cached in memory). Always returns a list."""
+    return STORE.load()
 
 
 def save_db(data):
-    """Save issuers list back to JSON file."""
-    with open(DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Replace the whole issuers list in storage and the in-memory copy."""
+    STORE.save(data)
 
 
-def next_id(issuers):
-    """Calculate next numeric ID."""
-    return max((i.get("id", 0) for i in issuers), default=0) + 1
+def find_issuer(issuer_id):
+    """Find a single issuer dict by id via the store's id index."""
+    return STORE.get(issuer_id)
 
 
-def find_issuer(issuer_id):
-    """Find a single issuer dict by id."""
-    issuers = load_db()
-    issuer = next((i for i in issuers if i.get("id") == issuer_id), None)
-    return issuers, issuer
+def utc_now():
+    """Timestamp stored in `updated_at` (sortable ISO-8601, UTC)."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def paginate(status):
+    """
+    Read cursor/limit/filters from the query string and return one page of
+    issuers with `status` plus the template context for pager links.
+    ?after=<id>&limit=<n>&prefecture=..&category=..&certification=..
+    """
+    after = request.args.get("after", "0").strip()
+    limit = request.args.get("limit", "").strip()
+    after = int(after) if after.isdigit() else 0
+    limit = int(limit) if limit.isdigit() else PAGE_SIZE_DEFAULT
+    limit = max(1, min(limit, PAGE_SIZE_MAX))
+    filters = {f: request.args.get(f, "").strip() for f in FILTER_FIELDS}
+
+    issuers, next_cursor = STORE.page(status, after=after, limit=limit, **filters)
+    return {
+        "issuers": issuers,
+        "next_cursor": next_cursor,
+        "after": after,
+        "limit": limit,
+        "filters": filters,
+    }
+
+
+# ---------- Metadata cache ----------
+
+# issuer_id -> (source row, serialized JSON bytes, ETag); dropped by store
+# writes, and only reused for the exact row it was built from
+_METADATA_CACHE = {}
+
+
+def _invalidate_metadata(ids):
+    if ids is None:
+        _METADATA_CACHE.clear()
+        return
+    for issuer_id in ids:
+        _METADATA_CACHE.pop(issuer_id, None)
+
+
+STORE.subscribe(_invalidate_metadata)
+
+
+def build_metadata(issuer):
+    """CIP-style metadata dict for an approved issuer."""
+    return {
+        "version": 1,
+        "issuer_id": issuer["id"],
+        "company_name": issuer["company_name"],
+        "product_name": issuer["product_name"],
+        "prefecture": issuer["prefecture"],
+        "category": issuer["category"],
+        "certification": issuer["certification"],
+        "lot_size": issuer["lot_size"],
+        "harvest_date": issuer["harvest_date"],
+        "proof_url": issuer["proof_url"],
+        "notes": issuer["notes"],
+        "hashirwa_demo": True,
+        "updated_at": issuer.get("updated_at", ""),
+    }
+
+
+def _serialize_metadata(issuer):
+    body = app.json.dumps(build_metadata(issuer)).encode("utf-8")
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+
+def cached_metadata(issuer, store=True):
+    """
+    Serialized metadata bytes and content-hash ETag, built once per change.
+    Store rows are replaced (never edited) on update, so an entry is valid
+    only for the dict it was built from; a request still holding an older
+    row cannot put its body back in front of the current one.
+    """
+    entry = _METADATA_CACHE.get(issuer["id"])
+    if entry is not None and entry[0] is issuer:
+        return entry[1:]
+    body, etag = _serialize_metadata(issuer)
+    if store:
+        _METADATA_CACHE[issuer["id"]] = (issuer, body, etag)
+    return body, etag
 
 
 # ---------- Routes: Public / UX ----------
@@ -69,9 +150,8 @@ def landing():
     Landing page explaining the HashiRWA flow:
     Onboard -> Review -> Publish -> On-chain metadata.
     """
-    issuers = load_db()
-    approved_count = sum(1 for i in issuers if i.get("status") == "approved")
-    pending_count = sum(1 for i in issuers if i.get("status") == "pending")
+    approved_count = STORE.count("approved")
+    pending_count = STORE.count("pending")
     return render_template(
         "landing.html",
         approved_count=approved_count,
@@ -83,10 +163,9 @@ def landing():
 def listings():
     """
     Public marketplace view:
-    Only approved issuers are shown.
+    Only approved issuers are shown, one cursor page at a time.
     """
-    issuers = [i for i in load_db() if i.get("status") == "approved"]
-    return render_template("listings.html", issuers=issuers)
+    return render_template("listings.html", **paginate("approved"))
 
 
 # ---------- Routes: Producer Onboarding ----------
@@ -99,7 +178,6 @@ def onboard():
     POST: validate + save new pending listing.
     """
     if request.method == "POST":
-        issuers = load_db()
         form = request.form
 
         # Required fields for the demo
@@ -133,7 +211,7 @@ def onboard():
             return redirect(url_for("onboard"))
 
         new_issuer = {
-            "id": next_id(issuers),
+            "id": None,  # allocated by STORE.add() under the write lock
             "company_name": form.get("company_name"),
             "product_name": form.get("product_name"),
             "prefecture": form.get("prefecture"),
@@ -146,10 +224,10 @@ def onboard():
             "proof_url": form.get("proof_url") or "",
             "status": "pending",
             "notes": form.get("notes") or "",
+            "updated_at": utc_now(),
         }
 
-        issuers.append(new_issuer)
-        save_db(issuers)
+        STORE.add(new_issuer)
         flash("Thank you! Your listing has been submitted for review.",
               "success")
         return redirect(url_for("landing"))
@@ -166,11 +244,10 @@ def admin_dashboard():
     """
     Simple admin dashboard summary.
     """
-    issuers = load_db()
-    total = len(issuers)
-    pending = sum(1 for i in issuers if i.get("status") == "pending")
-    approved = sum(1 for i in issuers if i.get("status") == "approved")
-    rejected = sum(1 for i in issuers if i.get("status") == "rejected")
+    total = STORE.count()
+    pending = STORE.count("pending")
+    approved = STORE.count("approved")
+    rejected = STORE.count("rejected")
     return render_template(
         "admin_dashboard.html",
         total=total,
@@ -183,10 +260,9 @@ def admin_dashboard():
 @app.route("/admin/pending")
 def admin_pending():
     """
-    List of pending issuers to review.
+    List of pending issuers to review (cursor paginated).
     """
-    issuers = [i for i in load_db() if i.get("status") == "pending"]
-    return render_template("admin_pending.html", issuers=issuers)
+    return render_template("admin_pending.html", **paginate("pending"))
 
 
 @app.route("/admin/review/<int:issuer_id>", methods=["GET", "POST"])
@@ -194,11 +270,13 @@ def admin_review(issuer_id):
     """
     Review screen: approve or reject a single listing.
     """
-    issuers, issuer = find_issuer(issuer_id)
+    issuer = find_issuer(issuer_id)
     if issuer is None:
         return "Issuer not found", 404
 
     if request.method == "POST":
+        # Edit a copy; STORE.update() swaps it in once it is persisted
+        issuer = dict(issuer)
         action = request.form.get("action")
         if action == "approve":
             issuer["status"] = "approved"
@@ -214,7 +292,8 @@ def admin_review(issuer_id):
             issuer["status"] = "pending"
             flash("Invalid status detected, reverted to pending.", "error")
 
-        save_db(issuers)
+        issuer["updated_at"] = utc_now()
+        STORE.update(issuer)
         return redirect(url_for("admin_pending"))
 
     return render_template("admin_review.html", issuer=issuer)
@@ -223,40 +302,81 @@ def admin_review(issuer_id):
 @app.route("/admin/published")
 def admin_published():
     """
-    View of approved listings from admin perspective.
+    View of approved listings from admin perspective (cursor paginated).
     """
-    issuers = [i for i in load_db() if i.get("status") == "approved"]
-    return render_template("admin_published.html", issuers=issuers)
+    return render_template("admin_published.html", **paginate("approved"))
 
 
 # ---------- Route: Simulated on-chain metadata ----------
 
 
+@app.route("/metadata")
+def metadata_feed():
+    """
+    Bulk metadata for all approved issuers, streamed from the store.
+    ?format=ndjson (default) emits one JSON object per line,
+    ?format=json a chunked JSON array.
+    ?since=<updated_at> only includes issuers updated at or after that
+    timestamp, for incremental sync; issuers that were updated since then
+    but are no longer approved are sent as tombstones
+    ({"issuer_id", "status", "updated_at"}) so indexers can drop them.
+    """
+    fmt = request.args.get("format", "ndjson").strip().lower()
+    if fmt not in ("ndjson", "json"):
+        return jsonify({"error": "invalid_format"}), 400
+    since = request.args.get("since", "").strip()
+
+    # Snapshot the matching rows now; the generator runs after we return
+    if since:
+        issuers = [i for i in STORE.load() if i.get("updated_at", "") >= since]
+        issuers.sort(key=lambda i: i["id"])
+    else:
+        issuers = STORE.by_status("approved")
+
+    def body(issuer):
+        if issuer.get("status") != "approved":
+            return app.json.dumps({
+                "issuer_id": issuer["id"],
+                "status": issuer.get("status"),
+                "updated_at": issuer.get("updated_at", ""),
+            }).encode("utf-8")
+        # Read-only use of the cache: a slow client may still be streaming
+        # rows that have since been replaced
+        return cached_metadata(issuer, store=False)[0]
+
+    def ndjson():
+        for issuer in issuers:
+            yield body(issuer) + b"\n"
+
+    def json_array():
+        yield b"["
+        for n, issuer in enumerate(issuers):
+            yield (b"," if n else b"") + body(issuer)
+        yield b"]"
+
+    if fmt == "json":
+        return Response(json_array(), mimetype="application/json")
+    return Response(ndjson(), mimetype="application/x-ndjson")
+
+
 @app.route("/metadata/<int:issuer_id>")
 def metadata(issuer_id):
     """
     Return JSON metadata for a single approved issuer.
-    This simulates CIP-style on-chain metadata lookup.
+    This simulates CIP-style on-chain metadata lookup; responses carry an
+    ETag so polling indexers and wallets get 304s until the issuer changes.
     """
-    _, issuer = find_issuer(issuer_id)
+    issuer = find_issuer(issuer_id)
     if issuer is None or issuer.get("status") != "approved":
         return jsonify({"error": "not_found_or_not_approved"}), 404
 
-    meta = {
-        "version": 1,
-        "issuer_id": issuer["id"],
-        "company_name": issuer["company_name"],
-        "product_name": issuer["product_name"],
-        "prefecture": issuer["prefecture"],
-        "category": issuer["category"],
-        "certification": issuer["certification"],
-        "lot_size": issuer["lot_size"],
-        "harvest_date": issuer["harvest_date"],
-        "proof_url": issuer["proof_url"],
-        "notes": issuer["notes"],
-        "hashirwa_demo": True,
-    }
-    return jsonify(meta)
+    body, etag = cached_metadata(issuer)
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = METADATA_MAX_AGE
+    # Answers If-None-Match with 304 and an empty body
+    return resp.make_conditional(request)
 
 
 # ---------- Main entrypoint ----------
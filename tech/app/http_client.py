@@ -0,0 +1,122 @@
+"""
+Shared, pooled HTTP client for outbound requests (dataset downloads).
+
+One requests.Session with a mounted HTTPAdapter is reused by every thread,
+so calls to the same host ride on kept-alive connections instead of paying
+a fresh TCP + TLS handshake each time. The adapter bounds the pool
+(HASHIRWA_HTTP_POOL_SIZE connections per host) and retries idempotent
+requests answered with 429/5xx with exponential backoff, honouring
+Retry-After. Timeouts are looked up per host in HOST_TIMEOUTS.
+
+Connect and read failures are not retried: each attempt would wait out
+the full per-host timeout again, so a hanging upstream would cost a
+multiple of it. One slow attempt stays within the Chainlink Functions
+request budget; the dataset cache serves its stale copy meanwhile.
+
+stats() reports, per host, requests sent vs. sockets actually opened, i.e.
+how often a kept-alive connection was reused.
+"""
+from __future__ import annotations
+
+import os
+from threading import Lock
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+POOL_SIZE = int(os.environ.get("HASHIRWA_HTTP_POOL_SIZE", "20"))
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+HOST_TIMEOUTS = {
+    "raw.githubusercontent.com": (3.05, 8),
+}
+
+RETRY = Retry(
+    total=2,
+    connect=0,
+    read=0,
+    other=0,
+    status=2,
+    backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+_lock = Lock()
+_session: requests.Session | None = None
+_counters: dict[str, dict[str, int]] = {}
+
+
+def _count(host: str, field: str) -> None:
+    with _lock:
+        c = _counters.setdefault(host, {"requests": 0, "connects": 0})
+        c[field] += 1
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _count(f"{self.host}:{self.port}", "connects")
+        super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _count(f"{self.host}:{self.port}", "connects")
+        super().connect()
+
+
+class _CountingHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _CountingHTTPPool, "https": _CountingHTTPSPool}
+
+
+def get_session() -> requests.Session:
+    """The process-wide pooled session (created on first use)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                adapter = _PooledAdapter(pool_connections=8, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def timeout_for(url: str):
+    return HOST_TIMEOUTS.get(urlsplit(url).hostname or "", DEFAULT_TIMEOUT)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared pool; `timeout` defaults to the host's entry."""
+    kwargs.setdefault("timeout", timeout_for(url))
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    _count(f"{parts.hostname}:{port}", "requests")
+    return get_session().get(url, **kwargs)
+
+
+def stats() -> dict:
+    """Per-host requests sent, sockets opened and connections reused."""
+    with _lock:
+        counters = {h: dict(c) for h, c in _counters.items()}
+    for c in counters.values():
+        c["reused"] = max(c["requests"] - c["connects"], 0)
+    return {"pool_maxsize": POOL_SIZE, "hosts": counters}
@@ -0,0 +1,234 @@
+"""
+Process-wide issuer store for hashi.py.
+
+The parsed issuers list is kept in memory and the backend (see storage.py)
+is only re-read when its change signature moves, e.g. after a manual edit
+of data.json or a write from another worker. Writes go through save(),
+add() or update(), which persist to the backend and update the in-memory
+copy together.
+
+Alongside the list the store maintains an id -> issuer index and the
+highest id seen, so lookups and id allocation never scan the list, plus
+(field, value) -> sorted ids postings for status, prefecture, category and
+certification. The status partitions double as live counters and all of
+them back cursor pagination in page().
+
+Derived caches register with subscribe() and are told which ids changed
+(or None when everything was reloaded) after every write.
+"""
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left, bisect_right, insort
+from threading import RLock
+
+log = logging.getLogger(__name__)
+
+
+# Fields with a secondary (field, value) -> sorted ids index
+INDEXED_FIELDS = ("status", "prefecture", "category", "certification")
+
+
+def index_key(value) -> str:
+    """Normalised form used for index keys and filter values."""
+    return str(value if value is not None else "").strip().casefold()
+
+
+class IssuerStore:
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = RLock()
+        self._issuers: list | None = None
+        self._sig = None
+        self._by_id: dict[int, dict] = {}
+        self._max_id = 0
+        self._postings: dict[tuple[str, str], list[int]] = {}
+        self._keys_of: dict[int, tuple] = {}
+        self._listeners: list = []
+
+    def load(self) -> list:
+        """
+        Return the cached issuers list, reloading it only if the backend changed.
+        The list and its dicts are shared and read by other threads: never
+        mutate them in place. Change a copy and pass it to update(), or
+        build a new list for save().
+        """
+        issuers = self._issuers
+        if issuers is not None and self.backend.signature() == self._sig:
+            return issuers
+
+        with self._lock:
+            sig = self.backend.signature()
+            if self._issuers is not None and sig == self._sig:
+                return self._issuers
+            # Signature is taken before reading: a write that lands meanwhile
+            # leaves it stale, so the next load() simply reloads again
+            try:
+                issuers = self.backend.read_all()
+            except ValueError as e:
+                # Unreadable file: keep serving the last good copy rather
+                # than treating it as an empty DB (and wiping it on save)
+                if self._issuers is None:
+                    raise
+                log.error("issuer store: keeping cached copy, reload failed: %s", e)
+                self._sig = sig
+                return self._issuers
+            self._issuers = issuers
+            self._sig = sig
+            self._reindex()
+            self._notify(None)
+            return self._issuers
+
+    def save(self, issuers: list) -> None:
+        """Replace all issuers on disk and in memory (write-through)."""
+        with self._lock, self.backend.lock.exclusive():
+            self.backend.write_all(issuers)
+            self._issuers = issuers
+            self._sig = self.backend.signature()
+            self._reindex()
+            self._notify(None)
+
+    def add(self, issuer: dict) -> None:
+        """
+        Persist a new issuer as a single-row insert where the backend allows it.
+        An unset id ("id": None) is allocated here, under the cross-process
+        write lock and after picking up other workers' writes.
+        """
+        with self._lock, self.backend.lock.exclusive():
+            issuers = self.load()
+            if issuer.get("id") is None:
+                issuer["id"] = self._max_id + 1
+            issuers.append(issuer)
+            try:
+                self.backend.insert(issuers, issuer)
+            except Exception:
+                issuers.pop()
+                raise
+            self._sig = self.backend.signature()
+            self._index(issuer)
+            self._notify({issuer.get("id")})
+
+    def update(self, issuer: dict) -> None:
+        """
+        Persist a changed copy of an issuer (e.g. dict(get(id)) with edits).
+        The copy replaces the cached row only after the backend write
+        succeeded, so readers never see unpersisted changes.
+        """
+        with self._lock, self.backend.lock.exclusive():
+            issuers = self.load()
+            current = self._by_id.get(issuer.get("id"))
+            if current is not None and current is not issuer:
+                pos = next(n for n, i in enumerate(issuers) if i is current)
+                updated = issuers[:pos] + [issuer] + issuers[pos + 1:]
+            else:
+                updated = issuers
+            self.backend.update(updated, issuer)
+            if updated is not issuers:
+                issuers[pos] = issuer
+            self._by_id[issuer.get("id")] = issuer
+            self._sig = self.backend.signature()
+            self._index_fields(issuer)
+            self._notify({issuer.get("id")})
+
+    def get(self, issuer_id: int) -> dict | None:
+        """O(1) lookup of a single issuer by id."""
+        self.load()
+        return self._by_id.get(issuer_id)
+
+    def next_id(self) -> int:
+        """
+        Next numeric id; the tracked maximum only ever grows. Informational
+        only across workers: add() allocates the id actually stored.
+        """
+        self.load()
+        return self._max_id + 1
+
+    def subscribe(self, listener) -> None:
+        """Register listener(ids) for change notifications; ids=None means all."""
+        self._listeners.append(listener)
+
+    def _notify(self, ids) -> None:
+        for listener in self._listeners:
+            listener(ids)
+
+    def count(self, status: str | None = None) -> int:
+        """Number of issuers, optionally only those with `status`. O(1)."""
+        self.load()
+        if status is None:
+            return len(self._by_id)
+        return len(self._postings.get(("status", index_key(status)), ()))
+
+    def by_status(self, status: str) -> list:
+        """Issuers with `status`, ordered by id, touching only matching rows."""
+        self.load()
+        by_id = self._by_id
+        return [by_id[i] for i in self._postings.get(("status", index_key(status)), ())]
+
+    def page(self, status: str, after: int = 0, limit: int = 50, **filters):
+        """
+        Cursor page of issuers with `status` and id > `after`, ordered by id.
+
+        Extra keyword filters (prefecture, category, certification) match the
+        normalised field value. The shortest matching postings list drives the
+        scan, so cost depends on the page size, not the catalogue size.
+        Returns (issuers, next_cursor); next_cursor is None on the last page.
+        """
+        self.load()
+        wanted = {"status": index_key(status)}
+        for field, value in filters.items():
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"Cannot filter on {field!r}")
+            if value:
+                wanted[field] = index_key(value)
+
+        lists = [self._postings.get((f, v), []) for f, v in wanted.items()]
+        driver = min(lists, key=len)
+        by_id = self._by_id
+        keys_of = self._keys_of
+        positions = [(INDEXED_FIELDS.index(f), v) for f, v in wanted.items()]
+
+        items = []
+        for issuer_id in driver[bisect_right(driver, after):]:
+            keys = keys_of[issuer_id]
+            if all(keys[pos] == v for pos, v in positions):
+                if len(items) == limit:
+                    return items, items[-1]["id"]
+                items.append(by_id[issuer_id])
+        return items, None
+
+    def _index(self, issuer: dict) -> None:
+        issuer_id = issuer.get("id", 0)
+        self._by_id[issuer_id] = issuer
+        if isinstance(issuer_id, int) and issuer_id > self._max_id:
+            self._max_id = issuer_id
+        self._index_fields(issuer)
+
+    def _index_fields(self, issuer: dict) -> None:
+        issuer_id = issuer.get("id", 0)
+        new = tuple(index_key(issuer.get(f)) for f in INDEXED_FIELDS)
+        old = self._keys_of.get(issuer_id)
+        if old == new:
+            return
+        for field, old_key, new_key in zip(INDEXED_FIELDS, old or (None,) * len(new), new):
+            if old_key == new_key:
+                continue
+            if old_key is not None:
+                ids = self._postings[(field, old_key)]
+                pos = bisect_left(ids, issuer_id)
+                if pos < len(ids) and ids[pos] == issuer_id:
+                    del ids[pos]
+            insort(self._postings.setdefault((field, new_key), []), issuer_id)
+        self._keys_of[issuer_id] = new
+
+    def _reindex(self) -> None:
+        self._by_id = {}
+        self._postings = {}
+        self._keys_of = {}
+        for issuer in self._issuers:
+            self._index(issuer)
+
+    def invalidate(self) -> None:
+        """Drop the cached copy; the next load() re-reads the backend."""
+        with self._lock:
+            self._issuers = None
+            self._sig = None
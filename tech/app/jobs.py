@@ -0,0 +1,222 @@
+"""
+Persistent background job queue for slow chain work.
+
+trigger_chainlink_price used to block a Flask worker for up to 120 s. Jobs
+are now recorded in SQLite (data/jobs.db, WAL mode) and executed by a
+bounded thread pool, so the web tier returns a job id immediately and the
+caller polls for the result.
+
+Job lifecycle: queued -> running -> done | failed. Rows remember the
+owning process (host:pid:boot token, so a reused pid is not mistaken for
+the old owner); when a process starts and finds jobs whose owner is gone,
+queued ones are taken over and re-run, running ones are marked failed
+("interrupted") because their transaction may already be on chain.
+
+Runners are plain callables registered per kind: runner(args) -> dict.
+Raising JobError (or anything else) fails the job with that message.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    args        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    result      TEXT,
+    error       TEXT,
+    owner       TEXT,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+"""
+
+ACTIVE = ("queued", "running")
+
+
+class JobError(Exception):
+    """Expected failure of a job; the message is stored as the job error."""
+
+
+class QueueFull(Exception):
+    pass
+
+
+# Distinguishes this process from an earlier one that had the same pid
+# (e.g. a container restarted with the same hostname)
+_BOOT = uuid.uuid4().hex[:12]
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{_BOOT}"
+
+
+def _owner_alive(owner: str | None) -> bool:
+    parts = (owner or "").split(":")
+    if len(parts) == 3:
+        host, pid, boot = parts
+    elif len(parts) == 2:
+        (host, pid), boot = parts, None  # rows written before boot tokens
+    else:
+        return False
+    if host != socket.gethostname():
+        return bool(host)  # another machine's job: leave it alone
+    if not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return boot == _BOOT
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+class JobQueue:
+    def __init__(self, path: str, workers: int = 2, max_pending: int = 100):
+        self.path = path
+        self.workers = workers
+        self.max_pending = max_pending
+        self._runners: dict = {}
+        self._lock = Lock()
+        self._pool: ThreadPoolExecutor | None = None
+        self._conn: sqlite3.Connection | None = None
+
+    def register(self, kind: str, runner) -> None:
+        self._runners[kind] = runner
+
+    # ---- public API ----------------------------------------------------
+
+    def enqueue(self, kind: str, args: dict) -> dict:
+        """Record a job and hand it to the pool; returns the job row."""
+        if kind not in self._runners:
+            raise ValueError(f"No runner registered for job kind {kind!r}")
+        self._start()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs pending")
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, args, status, owner, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(args), _owner(), time.time()),
+            )
+        self._pool.submit(self._run, job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict | None:
+        self._start()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, args, status, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        id_, kind, args, status, result, error, created, started, finished = row
+        return {
+            "job_id": id_,
+            "kind": kind,
+            "args": json.loads(args),
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created,
+            "started_at": started,
+            "finished_at": finished,
+        }
+
+    # ---- internals -----------------------------------------------------
+
+    def _start(self) -> None:
+        if self._pool is not None:
+            return
+        with self._lock:
+            if self._pool is not None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            resume = self._recover_locked()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        for job_id in resume:
+            self._pool.submit(self._run, job_id)
+
+    def _recover_locked(self) -> list:
+        """Take over jobs left behind by dead processes."""
+        rows = self._conn.execute(
+            "SELECT id, status, owner FROM jobs WHERE status IN (?, ?)", ACTIVE
+        ).fetchall()
+        resume = []
+        me = _owner()
+        for job_id, status, owner in rows:
+            if owner == me or _owner_alive(owner):
+                continue
+            # Conditional on the row still being as we saw it: another worker
+            # recovering at the same moment must not take the same job over
+            if status == "running":
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'interrupted', finished_at = ? "
+                    "WHERE id = ? AND status = 'running' AND owner IS ?",
+                    (time.time(), job_id, owner),
+                )
+            else:
+                cur = self._conn.execute(
+                    "UPDATE jobs SET owner = ? WHERE id = ? AND status = 'queued' AND owner IS ?",
+                    (me, job_id, owner),
+                )
+                if cur.rowcount == 1:
+                    resume.append(job_id)
+        return resume
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            # Atomic claim: only one process can move the row out of 'queued'
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, started_at = ? WHERE id = ? AND status = 'queued'",
+                (_owner(), time.time(), job_id),
+            )
+            if cur.rowcount != 1:
+                return
+            kind, args = self._conn.execute(
+                "SELECT kind, args FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+        try:
+            result = self._runners[kind](json.loads(args))
+        except Exception as e:
+            if not isinstance(e, JobError):
+                log.exception("job %s (%s) crashed", job_id, kind)
+            self._finish(job_id, "failed", None, str(e) or type(e).__name__)
+            return
+        self._finish(job_id, "done", result, None)
+
+    def _finish(self, job_id: str, status: str, result, error) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
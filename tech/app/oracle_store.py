@@ -0,0 +1,239 @@
+"""
+Resident oracle cache for api_endpoints.py (data/oracle_cache.json).
+
+The feed is published as an immutable OracleSnapshot. Readers grab the
+current snapshot reference and look records up in it without taking any
+lock, so the Chainlink DON and the listings page never wait on a writer.
+Writers (admin endpoints) serialize on a writer-only lock plus the
+cross-process file lock, build a new snapshot copy-on-write, persist it
+atomically and swap the reference. Changes made by other workers are
+noticed through the file signature, checked at most every
+`check_interval` seconds.
+
+Writes compute which issuers actually changed; derived caches register
+with subscribe() and are called with those issuer ids (None when the feed
+was reloaded wholesale from disk).
+
+Shape:
+{
+  "cert_by_issuer": { "1": {"ok":1,"std":"JGAP","sub":"..."} },
+  "price_by_issuer": { "1": {"ok":1,"sku":"...","jpykg":4200.00} }
+  "meta": {"dataset_sha256": "...", "synced_at": "...", "changed_ids": [...]}
+}
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from threading import Lock
+from types import MappingProxyType
+
+from filelock import FileLock
+from fileio import atomic_write_json, file_signature
+
+KINDS = ("cert_by_issuer", "price_by_issuer")
+
+
+def id_order(issuer_id: str):
+    """Sort key for issuer id strings: numeric ids first, in numeric order."""
+    return (0, int(issuer_id)) if issuer_id.isdigit() else (1, issuer_id)
+
+
+def _diverge(data: dict) -> None:
+    """A targeted edit means the feed no longer equals the last synced dataset."""
+    if "meta" in data:
+        data["meta"].pop("dataset_sha256", None)
+
+
+class OracleSnapshot:
+    """
+    Read-only view of the feed at one point in time. Published snapshots
+    are never mutated; treat the record dicts as read-only too.
+    """
+
+    __slots__ = ("cert_by_issuer", "price_by_issuer", "meta", "sig", "version")
+
+    def __init__(self, data: dict, sig, version: int):
+        self.cert_by_issuer = MappingProxyType(dict(data.get("cert_by_issuer") or {}))
+        self.price_by_issuer = MappingProxyType(dict(data.get("price_by_issuer") or {}))
+        self.meta = MappingProxyType(dict(data.get("meta") or {}))
+        self.sig = sig
+        self.version = version
+
+    def get(self, kind: str, issuer_id: str) -> dict | None:
+        return getattr(self, kind).get(issuer_id)
+
+    def to_dict(self) -> dict:
+        data = {k: dict(getattr(self, k)) for k in KINDS}
+        if self.meta:
+            data["meta"] = dict(self.meta)
+        return data
+
+
+class OracleStore:
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.file_lock = FileLock(path + ".lock")
+        self._write_lock = Lock()
+        self._snap: OracleSnapshot | None = None
+        self._checked_at = 0.0
+        self._listeners: list = []
+
+    # ---- reads (lock-free) ---------------------------------------------
+
+    def current(self) -> OracleSnapshot:
+        """The published snapshot; use one for reads that must be consistent."""
+        snap = self._snap
+        if snap is None or time.monotonic() - self._checked_at >= self.check_interval:
+            snap = self._refresh_if_changed()
+        return snap
+
+    def get(self, kind: str, issuer_id: str) -> dict | None:
+        """Record for one issuer (None if absent)."""
+        return self.current().get(kind, issuer_id)
+
+    def snapshot(self) -> dict:
+        """Plain-dict copy of the whole feed."""
+        return self.current().to_dict()
+
+    # ---- writes (copy-on-write) ----------------------------------------
+
+    def set(self, kind: str, issuer_id: str, rec: dict) -> None:
+        """Store one record and persist it."""
+        with self._write_lock, self.file_lock.exclusive():
+            data = self._reload_locked().to_dict()
+            data[kind][issuer_id] = rec
+            _diverge(data)
+            self._publish_locked(data)
+        self._notify({issuer_id})
+
+    def apply(self, updates: dict) -> dict:
+        """
+        Merge {kind: {issuer_id: rec}} into the feed with one atomic write,
+        skipping records that are already identical (no write at all when
+        nothing changed). Returns per-kind added/changed ids and the
+        unchanged count.
+        """
+        with self._write_lock, self.file_lock.exclusive():
+            snap = self._reload_locked()
+            data = None
+            report = {}
+            for kind, recs in updates.items():
+                current = getattr(snap, kind)
+                added, changed, unchanged = [], [], 0
+                for issuer_id, rec in recs.items():
+                    old = current.get(issuer_id)
+                    if old == rec:
+                        unchanged += 1
+                        continue
+                    (added if old is None else changed).append(issuer_id)
+                    if data is None:
+                        data = snap.to_dict()
+                        _diverge(data)
+                    data[kind][issuer_id] = rec
+                report[kind] = {"added": added, "changed": changed, "unchanged": unchanged}
+            if data is not None:
+                self._publish_locked(data)
+        self._notify({i for r in report.values() for i in r["added"] + r["changed"]})
+        return report
+
+    def replace(self, certs: dict, prices: dict, source_hash: str | None = None) -> dict:
+        """
+        Make the feed equal to `certs`/`prices`, writing only if something
+        differs. `source_hash` identifies the dataset; when it matches the
+        last synced one the diff is skipped entirely. Returns per-kind
+        added/changed/removed ids, the union of changed issuer ids and
+        whether the write was skipped.
+        """
+        new = {"cert_by_issuer": certs, "price_by_issuer": prices}
+        with self._write_lock, self.file_lock.exclusive():
+            snap = self._reload_locked()
+            if source_hash is not None and snap.meta.get("dataset_sha256") == source_hash:
+                return {"skipped": True, "changed_ids": []}
+
+            report = {"skipped": False}
+            changed_ids = set()
+            for kind in KINDS:
+                old, recs = getattr(snap, kind), new[kind]
+                added = [k for k in recs if k not in old]
+                removed = [k for k in old if k not in recs]
+                changed = [k for k in recs if k in old and old[k] != recs[k]]
+                report[kind] = {"added": added, "changed": changed, "removed": removed}
+                changed_ids.update(added, changed, removed)
+            report["changed_ids"] = sorted(changed_ids, key=id_order)
+
+            if changed_ids or (source_hash is not None and source_hash != snap.meta.get("dataset_sha256")):
+                data = {k: dict(new[k]) for k in KINDS}
+                data["meta"] = {
+                    "dataset_sha256": source_hash,
+                    "synced_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "changed_ids": report["changed_ids"],
+                }
+                self._publish_locked(data)
+        if changed_ids:
+            self._notify(changed_ids)
+        return report
+
+    def subscribe(self, listener) -> None:
+        """Register listener(issuer_ids) for change notifications; None means all."""
+        self._listeners.append(listener)
+
+    def _notify(self, ids) -> None:
+        if ids is not None and not ids:
+            return
+        for listener in self._listeners:
+            listener(ids)
+
+    def invalidate(self) -> None:
+        """Force the next read to re-check the file."""
+        self._checked_at = 0.0
+
+    # ---- internals -----------------------------------------------------
+
+    def _refresh_if_changed(self) -> OracleSnapshot:
+        self._checked_at = time.monotonic()
+        snap = self._snap
+        if snap is not None and file_signature(self.path) == snap.sig:
+            return snap
+        if snap is not None and not self._write_lock.acquire(blocking=False):
+            return snap  # a writer is busy; it will publish a newer snapshot
+        if snap is None:
+            self._write_lock.acquire()
+        try:
+            # creating a missing file is a write, everything else only reads
+            file_lock = self.file_lock.shared() if os.path.exists(self.path) else self.file_lock.exclusive()
+            with file_lock:
+                fresh = self._reload_locked()
+        finally:
+            self._write_lock.release()
+        if snap is not None and fresh is not snap:
+            self._notify(None)  # changed by another worker: ids unknown
+        return fresh
+
+    def _reload_locked(self) -> OracleSnapshot:
+        sig = file_signature(self.path)
+        snap = self._snap
+        if snap is not None and sig == snap.sig:
+            return snap
+        if sig is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            data = {"cert_by_issuer": {}, "price_by_issuer": {}}
+            atomic_write_json(self.path, data)
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        return self._swap(data, file_signature(self.path))
+
+    def _publish_locked(self, data: dict) -> OracleSnapshot:
+        # temp file + fsync + rename: readers never see a half-written cache
+        atomic_write_json(self.path, data)
+        self._checked_at = time.monotonic()
+        return self._swap(data, file_signature(self.path))
+
+    def _swap(self, data: dict, sig) -> OracleSnapshot:
+        version = self._snap.version + 1 if self._snap is not None else 1
+        snap = OracleSnapshot(data, sig, version)
+        self._snap = snap  # single reference assignment: atomic for readers
+        return snap
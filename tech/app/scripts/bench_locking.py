@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Contention benchmark for the cross-process issuer store lock.
+
+Spawns 1..16 worker processes that each onboard --writes issuers through
+their own IssuerStore on a shared temp datastore (like gunicorn workers),
+then checks that no write was lost and every id is unique.
+
+    python scripts/bench_locking.py [--writes 200] [--workers 1,2,4,8,16]
+                                    [--storage json|sqlite]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from issuer_store import IssuerStore  # noqa: E402
+from storage import JsonStorage, SqliteStorage  # noqa: E402
+
+
+def open_store(kind, directory):
+    if kind == "sqlite":
+        return IssuerStore(SqliteStorage(os.path.join(directory, "issuers.db")))
+    return IssuerStore(JsonStorage(os.path.join(directory, "data.json")))
+
+
+def worker(kind, directory, writes, start_evt):
+    store = open_store(kind, directory)
+    store.load()
+    start_evt.wait()
+    for n in range(writes):
+        store.add({
+            "id": None,
+            "company_name": f"pid {os.getpid()} #{n}",
+            "prefecture": "Fukuoka",
+            "category": "Green tea",
+            "status": "pending",
+        })
+
+
+def run(kind, workers, writes):
+    with tempfile.TemporaryDirectory() as tmp:
+        open_store(kind, tmp).load()  # create the empty datastore
+        start_evt = mp.Event()
+        procs = [mp.Process(target=worker, args=(kind, tmp, writes, start_evt)) for _ in range(workers)]
+        for p in procs:
+            p.start()
+        time.sleep(0.2)  # let every worker import and open the store
+        t0 = time.perf_counter()
+        start_evt.set()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - t0
+
+        issuers = open_store(kind, tmp).load()
+        ids = [i["id"] for i in issuers]
+        ok = len(ids) == workers * writes and len(set(ids)) == len(ids)
+        return workers * writes / elapsed, ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description="issuer store write contention")
+    ap.add_argument("--writes", type=int, default=200, help="writes per worker")
+    ap.add_argument("--workers", default="1,2,4,8,16")
+    ap.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    args = ap.parse_args()
+
+    print(f"{'workers':>8} {'writes/s':>10} {'consistent':>11}")
+    for w in (int(s) for s in args.workers.split(",")):
+        rate, ok = run(args.storage, w, args.writes)
+        print(f"{w:>8} {rate:>10.1f} {'yes' if ok else 'NO':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Read/write contention benchmark for the oracle cache.
+
+Compares the previous model (every read and write takes one mutex and
+re-parses oracle_cache.json) with OracleStore's copy-on-write snapshots
+(lock-free reads, writers swap a new snapshot). Reader threads look up
+random issuers, each paced at --read-hz, while one writer thread updates
+prices at --write-hz.
+
+Readers are paced (and yield when behind) because unpaced lock-free
+readers are pure-Python busy loops that starve the writer of the GIL;
+the table reports the writer's achieved rate and p99 latency next to
+its target so a starved writer is visible.
+
+    python scripts/bench_oracle.py [--readers 8] [--seconds 3]
+                                   [--read-hz 1000] [--write-hz 20]
+                                   [--issuers 500]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fileio import atomic_write_json  # noqa: E402
+from oracle_store import OracleStore  # noqa: E402
+
+
+class MutexCache:
+    """The pre-snapshot model: one mutex, JSON reload per call."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def get(self, kind, issuer_id):
+        with self.lock:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get(kind, {}).get(issuer_id)
+
+    def set(self, kind, issuer_id, rec):
+        with self.lock:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            cache.setdefault(kind, {})[issuer_id] = rec
+            atomic_write_json(self.path, cache)
+
+
+def seed(path, issuers):
+    atomic_write_json(path, {
+        "cert_by_issuer": {str(i): {"ok": 1, "std": "JGAP", "sub": f"s{i}"} for i in range(1, issuers + 1)},
+        "price_by_issuer": {str(i): {"ok": 1, "sku": f"sku{i}", "jpykg": 100.0} for i in range(1, issuers + 1)},
+    })
+
+
+def paced(stop, hz):
+    """Yield at a fixed rate until `stop`; when behind, just yield the GIL."""
+    interval = 1.0 / hz
+    due = time.perf_counter()
+    while not stop.is_set():
+        yield
+        due += interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            time.sleep(0)
+
+
+def run(cache, readers, seconds, read_hz, write_hz, issuers):
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    write_lat = []
+
+    def reader(slot):
+        rnd = random.Random(slot)
+        lat = latencies[slot]
+        for _ in paced(stop, read_hz):
+            issuer_id = str(rnd.randint(1, issuers))
+            t0 = time.perf_counter()
+            cache.get("price_by_issuer", issuer_id)
+            lat.append(time.perf_counter() - t0)
+
+    def writer():
+        rnd = random.Random(-1)
+        for _ in paced(stop, write_hz):
+            issuer_id = str(rnd.randint(1, issuers))
+            t0 = time.perf_counter()
+            cache.set("price_by_issuer", issuer_id, {"ok": 1, "sku": "x", "jpykg": rnd.random() * 1000})
+            write_lat.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    lat = sorted(x for slot in latencies for x in slot)
+    p99 = lat[int(len(lat) * 0.99)] if lat else 0.0
+    wlat = sorted(write_lat)
+    wp99 = wlat[int(len(wlat) * 0.99)] if wlat else 0.0
+    return len(lat) / seconds, p99 * 1e6, len(wlat) / seconds, wp99 * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser(description="oracle cache contention")
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--read-hz", type=float, default=1000.0, help="per reader thread")
+    ap.add_argument("--write-hz", type=float, default=20.0)
+    ap.add_argument("--issuers", type=int, default=500)
+    args = ap.parse_args()
+
+    target_r = args.read_hz * args.readers
+    print(f"target: {target_r:.0f} reads/s, {args.write_hz:.1f} writes/s")
+    print(f"{'model':>10} {'reads/s':>12} {'p99 read us':>12} {'writes/s':>9} {'p99 write ms':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, make in (("mutex", MutexCache), ("snapshot", OracleStore)):
+            path = os.path.join(tmp, f"{name}.json")
+            seed(path, args.issuers)
+            rps, p99, wps, wp99 = run(
+                make(path), args.readers, args.seconds, args.read_hz, args.write_hz, args.issuers
+            )
+            print(f"{name:>10} {rps:>12.0f} {p99:>12.1f} {wps:>9.1f} {wp99:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Write-throughput benchmark for the JSON datastores.
+
+Compares the old in-place dump (open "w" + json.dump) with the crash-safe
+atomic_write_json() (temp file + fsync + os.replace + dir fsync) for a few
+catalogue sizes. Runs against a temp directory; nothing in data/ is touched.
+
+    python scripts/bench_writes.py [--writes 50] [--sizes 10,1000,10000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fileio import atomic_write_json  # noqa: E402
+
+
+def make_issuers(n):
+    return [
+        {
+            "id": i,
+            "company_name": f"Issuer {i}",
+            "product_name": "Oku Yame Tea",
+            "prefecture": "Fukuoka",
+            "category": "Green tea",
+            "certification": "JFS-B",
+            "lot_size": "500",
+            "harvest_date": "2024-10-01",
+            "contact_email": "admin@example.com",
+            "wallet_address": "",
+            "proof_url": "",
+            "status": "approved",
+            "notes": "",
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def plain_write(path, obj):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+
+
+def bench(fn, path, obj, writes):
+    start = time.perf_counter()
+    for _ in range(writes):
+        fn(path, obj)
+    return writes / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="data.json write throughput")
+    ap.add_argument("--writes", type=int, default=50)
+    ap.add_argument("--sizes", default="10,1000,10000")
+    args = ap.parse_args()
+
+    print(f"{'issuers':>8} {'plain w/s':>12} {'atomic w/s':>12} {'ratio':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.json")
+        for n in (int(s) for s in args.sizes.split(",")):
+            issuers = make_issuers(n)
+            plain = bench(plain_write, path, issuers, args.writes)
+            atomic = bench(atomic_write_json, path, issuers, args.writes)
+            print(f"{n:>8} {plain:>12.1f} {atomic:>12.1f} {atomic / plain:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
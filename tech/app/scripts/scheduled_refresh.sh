@@ -7,9 +7,22 @@ ISSUERS=(1 2 3)
 # Local HashiRWA endpoint
 BASE="http://127.0.0.1:8080"
 
-for id in "${ISSUERS[@]}"; do
-  echo "[scheduled] triggering Chainlink price refresh for issuer_id=$id"
-  curl -s -X POST "${BASE}/api/v1/admin/trigger_chainlink_price?issuer_id=${id}" >/dev/null
-done
+# Refresh cert/price cache for all listed issuers from one dataset download
+ids_csv=$(IFS=,; echo "${ISSUERS[*]}")
+echo "[scheduled] refreshing oracle cache for issuer_ids=${ids_csv}"
+curl -s -X POST "${BASE}/api/v1/admin/refresh_many?issuer_ids=${ids_csv}" >/dev/null
+
+if [[ -n "${CHAINLINK_BATCH_DIR:-}" ]]; then
+  # One functions_request.py process for every issuer: requests share one
+  # RPC connection and results are printed as NDJSON as they arrive
+  echo "[scheduled] batch Chainlink price refresh for issuer_ids=${ids_csv}"
+  (cd "${CHAINLINK_BATCH_DIR}" && source .venv/bin/activate \
+    && python3 functions_request.py --batch -- "${ISSUERS[@]/#/price:}")
+else
+  for id in "${ISSUERS[@]}"; do
+    echo "[scheduled] triggering Chainlink price refresh for issuer_id=$id"
+    curl -s -X POST "${BASE}/api/v1/admin/trigger_chainlink_price?issuer_id=${id}" >/dev/null
+  done
+fi
 
 echo "[scheduled] done"
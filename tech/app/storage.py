@@ -0,0 +1,291 @@
+"""
+Storage backends for the issuers datastore.
+
+IssuerStore (issuer_store.py) keeps the parsed list in memory and talks to
+one of these backends:
+
+- JsonStorage:   data/data.json snapshot + append-only log (default)
+- SqliteStorage: SQLite in WAL mode, one row per issuer with indexed
+                 id/status/prefecture/category columns
+
+Backends share a small interface:
+
+    signature()            -> token that changes when another writer commits
+    read_all()             -> list of issuer dicts ordered by id
+    write_all(issuers)     -> replace everything
+    insert(issuers, row)   -> persist a newly appended issuer
+    update(issuers, row)   -> persist changes to an existing issuer
+
+insert/update receive the full in-memory list as well, so file-based
+backends can rewrite it while row-based backends only touch `row`.
+
+Every backend also exposes `lock`, a cross-process FileLock that
+IssuerStore holds exclusively while it allocates ids and writes, so
+several workers can share one datastore without losing updates.
+
+Select the backend with HASHIRWA_STORAGE=json|sqlite. The SQLite file
+defaults to data/issuers.db (HASHIRWA_SQLITE_PATH) and is seeded once from
+data/data.json the first time it is opened empty.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+from threading import Lock, Thread
+
+from filelock import FileLock
+from fileio import atomic_write_bytes, atomic_write_json, file_signature
+
+
+# Log records appended before the snapshot is rewritten in the background
+COMPACT_EVERY = 500
+
+
+class JsonStorage:
+    """
+    data.json snapshot plus an append-only mutation log (data.json.log).
+
+    Each onboarding/review appends one JSON line ({"op": "create" |
+    "approve" | "reject" | "update", "issuer": {...}}) and fsyncs it, so the
+    write cost does not depend on the catalogue size. Loading replays the
+    log over the snapshot (records are idempotent upserts by id). Once the
+    log holds COMPACT_EVERY records a background thread folds it into a new
+    snapshot and keeps only records appended meanwhile.
+    """
+
+    def __init__(self, path: str, compact_every: int = COMPACT_EVERY):
+        self.path = path
+        self.log_path = path + ".log"
+        self.compact_every = compact_every
+        self.lock = FileLock(path + ".lock")
+        self._lock = Lock()
+        self._log_records = 0
+        self._compacting = False
+
+    def signature(self):
+        return (file_signature(self.path), file_signature(self.log_path))
+
+    def read_all(self) -> list:
+        if not os.path.exists(self.path):
+            self.write_all([])  # create empty list file
+            return []
+        with self.lock.shared():
+            with open(self.path, "r", encoding="utf-8") as f:
+                # A corrupt file raises (ValueError) instead of reading as []
+                data = json.load(f)
+            if isinstance(data, list):
+                return self._replay(data)
+        # normalize to list
+        self.write_all([])
+        return []
+
+    def _replay(self, issuers: list) -> list:
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            self._log_records = 0
+            return issuers
+
+        pos = {i.get("id"): n for n, i in enumerate(issuers)}
+        records = 0
+        for n, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                issuer = json.loads(line)["issuer"]
+            except (ValueError, KeyError):
+                if n != len(lines) - 1:
+                    raise
+                # torn tail from a crash mid-append: cut it so the next
+                # append starts on a fresh line
+                good = "".join(l + "\n" for l in lines[:n])
+                with self._lock:
+                    atomic_write_bytes(self.log_path, good.encode("utf-8"))
+                break
+            records += 1
+            if issuer.get("id") in pos:
+                issuers[pos[issuer.get("id")]] = issuer
+            else:
+                pos[issuer.get("id")] = len(issuers)
+                issuers.append(issuer)
+        self._log_records = records
+        return issuers
+
+    def write_all(self, issuers: list) -> None:
+        with self.lock.exclusive(), self._lock:
+            atomic_write_json(self.path, issuers)
+            if os.path.exists(self.log_path):
+                atomic_write_bytes(self.log_path, b"")
+            self._log_records = 0
+
+    def insert(self, issuers: list, issuer: dict) -> None:
+        self._append("create", issuer, issuers)
+
+    def update(self, issuers: list, issuer: dict) -> None:
+        op = {"approved": "approve", "rejected": "reject"}.get(issuer.get("status"), "update")
+        self._append(op, issuer, issuers)
+
+    def _append(self, op: str, issuer: dict, issuers: list) -> None:
+        line = json.dumps({"op": op, "issuer": issuer}, ensure_ascii=False) + "\n"
+        with self.lock.exclusive(), self._lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                st = os.fstat(f.fileno())
+            self._log_records += 1
+            if self._log_records < self.compact_every or self._compacting:
+                return
+            self._compacting = True
+            # `issuers` is current up to this point because IssuerStore holds
+            # the exclusive lock and reloads before writing
+            snapshot = [dict(i) for i in issuers]
+        Thread(target=self._compact, args=(snapshot, st.st_ino, st.st_size), daemon=True).start()
+
+    def _compact(self, snapshot: list, log_inode: int, offset: int) -> None:
+        """Write `snapshot` (state up to log `offset`) and drop those log records."""
+        try:
+            with self.lock.exclusive(), self._lock:
+                try:
+                    f = open(self.log_path, "rb")
+                except FileNotFoundError:
+                    return
+                with f:
+                    if os.fstat(f.fileno()).st_ino != log_inode:
+                        return  # another worker compacted or rewrote meanwhile
+                    f.seek(offset)
+                    tail = f.read()
+                atomic_write_json(self.path, snapshot)
+                atomic_write_bytes(self.log_path, tail)
+                self._log_records = tail.count(b"\n")
+        finally:
+            self._compacting = False
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issuers (
+    id         INTEGER PRIMARY KEY,
+    status     TEXT NOT NULL,
+    prefecture TEXT,
+    category   TEXT,
+    doc        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_issuers_status ON issuers(status);
+CREATE INDEX IF NOT EXISTS idx_issuers_prefecture ON issuers(prefecture);
+CREATE INDEX IF NOT EXISTS idx_issuers_category ON issuers(category);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _row(issuer: dict) -> tuple:
+    return (
+        int(issuer["id"]),
+        issuer.get("status") or "pending",
+        issuer.get("prefecture"),
+        issuer.get("category"),
+        json.dumps(issuer, ensure_ascii=False),
+    )
+
+
+class SqliteStorage:
+    def __init__(self, path: str, seed_json_path: str | None = None):
+        self.path = path
+        self.lock = FileLock(path + ".lock")
+        self._lock = Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if seed_json_path:
+            self.migrate_from_json(seed_json_path)
+
+    def signature(self):
+        # data_version only moves when *another* connection commits; our own
+        # writes are applied to the in-memory copy by IssuerStore directly.
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def read_all(self) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT doc FROM issuers ORDER BY id").fetchall()
+        return [json.loads(doc) for (doc,) in rows]
+
+    def write_all(self, issuers: list) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM issuers")
+                self._conn.executemany(
+                    "INSERT INTO issuers (id, status, prefecture, category, doc) VALUES (?, ?, ?, ?, ?)",
+                    [_row(i) for i in issuers],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def insert(self, issuers: list, issuer: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO issuers (id, status, prefecture, category, doc) VALUES (?, ?, ?, ?, ?)",
+                _row(issuer),
+            )
+
+    def update(self, issuers: list, issuer: dict) -> None:
+        id_, status, prefecture, category, doc = _row(issuer)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE issuers SET status = ?, prefecture = ?, category = ?, doc = ? WHERE id = ?",
+                (status, prefecture, category, doc, id_),
+            )
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        One-shot import of an existing data.json. Runs only while the table is
+        empty and the import has not been recorded yet. Returns rows imported.
+        """
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'migrated_from_json'"
+            ).fetchone()
+            count = self._conn.execute("SELECT COUNT(*) FROM issuers").fetchone()[0]
+        if done or count or not os.path.exists(json_path):
+            return 0
+
+        issuers = JsonStorage(json_path).read_all()
+        self.write_all(issuers)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (os.path.abspath(json_path),),
+            )
+        return len(issuers)
+
+
+def make_storage(json_path: str):
+    """Build the backend selected by HASHIRWA_STORAGE (default: json)."""
+    kind = os.environ.get("HASHIRWA_STORAGE", "json").strip().lower()
+    if kind == "sqlite":
+        sqlite_path = os.environ.get("HASHIRWA_SQLITE_PATH", "").strip() or os.path.join(
+            os.path.dirname(json_path), "issuers.db"
+        )
+        return SqliteStorage(sqlite_path, seed_json_path=json_path)
+    if kind != "json":
+        raise ValueError(f"Unknown HASHIRWA_STORAGE: {kind!r} (expected json or sqlite)")
+    return JsonStorage(json_path)
+
+
+if __name__ == "__main__":
+    # Manual migration: python storage.py data/data.json data/issuers.db
+    if len(sys.argv) != 3:
+        print("usage: python storage.py <data.json> <issuers.db>")
+        raise SystemExit(2)
+    n = SqliteStorage(sys.argv[2]).migrate_from_json(sys.argv[1])
+    print(f"imported {n} issuer(s) into {sys.argv[2]}")